@@ -0,0 +1,141 @@
+import logging
+
+import pandas as pd
+
+
+#measures, resources are distinct ids, findings are non null finding ids, total matches are summed
+MEASURES = ['resources', 'findings', 'total_matches']
+
+
+#aggregations shown on the dashboard, name: (dimensions, measure)
+AGGREGATIONS = {
+    'resources_per_cloud_platform': (['_cloudPlatform'], 'resources'),
+    'resources_per_environment': (['__environments'], 'resources'),
+    'resources_per_status': (['_status'], 'resources'),
+    'resources_per_region': (['_region'], 'resources'),
+    'resources_per_type': (['type'], 'resources'),
+    'resources_per_creation_date': (['_creationYYMM'], 'resources'),
+    'resources_per_category': (['Category'], 'resources'),
+    'resources_per_severity': (['Severity'], 'resources'),
+    'findings_per_region': (['_region'], 'findings'),
+    'findings_per_type': (['type'], 'findings'),
+    'findings_per_classifier': (['Classifier'], 'findings'),
+    'findings_per_type_and_severity': (['type', 'Severity'], 'findings'),
+    'findings_per_type_and_classifier': (['type', 'Classifier'], 'findings'),
+    'total_matches_per_region': (['_region'], 'total_matches'),
+    'total_matches_per_type': (['type'], 'total_matches'),
+    'total_matches_per_classifier': (['Classifier'], 'total_matches'),
+    'total_matches_per_type_and_severity': (['type', 'Severity'], 'total_matches'),
+    'total_matches_per_type_and_classifier': (['type', 'Classifier'], 'total_matches')
+}
+
+
+#pivot conf, the playground, matches summed per resource and severity, one column per classifier
+PIVOT_INDEX = ['name', 'type', 'Severity']
+
+PIVOT_COLUMNS = 'Classifier'
+
+PIVOT_VALUES = ['Unique Matches', 'Total Matches']
+
+
+#get grouping sets, each distinct set of dimensions is aggregated once for every measure
+def get_grouping_sets(aggregations=AGGREGATIONS):
+    return list(dict.fromkeys(tuple(v[0]) for v in aggregations.values()))
+
+
+#get dimensions
+def get_dimensions(aggregations=AGGREGATIONS):
+    return list(dict.fromkeys(d for v in aggregations.values() for d in v[0]))
+
+
+#get grouping key
+def get_grouping_key(grouping_set):
+    return '|'.join(grouping_set)
+
+
+#get grouping id, mirrors snowflake GROUPING_ID, a bit set for every dimension rolled up
+def get_grouping_id(grouping_set, dimensions):
+    return sum(1 << (len(dimensions) - 1 - i) for i, d in enumerate(dimensions) if d not in grouping_set)
+
+
+#get cube query
+def get_cube_query(table, aggregations=AGGREGATIONS):
+    dimensions = get_dimensions(aggregations)
+
+    columns = ', '.join(f'"{d}"' for d in dimensions)
+
+    grouping_sets = ', '.join('(' + ', '.join(f'"{d}"' for d in s) + ')' for s in get_grouping_sets(aggregations))
+
+    return (
+        f'select {columns}, grouping_id({columns}) as "grouping_id", '
+        f'count(distinct "id") as "resources", count("Finding ID") as "findings", coalesce(sum("Total Matches"), 0) as "total_matches" '
+        f'from {table} group by grouping sets ({grouping_sets})'
+    )
+
+
+#get cube from snowflake, every grouping set in a single warehouse query
+def get_cube_from_snowflake(session, table, aggregations=AGGREGATIONS):
+    logging.getLogger().debug(f"get cube from snowflake: {table}")
+
+    cube = session.sql(get_cube_query(table, aggregations)).to_pandas()
+
+    dimensions = get_dimensions(aggregations)
+
+    grouping_ids = {get_grouping_id(s, dimensions): s for s in get_grouping_sets(aggregations)}
+
+    cube['grouping_set'] = cube['grouping_id'].map(lambda x: get_grouping_key(grouping_ids.get(int(x), ())))
+
+    return cube.drop(columns=['grouping_id'])
+
+
+#get cube from frame, one scan to the finest grain, every grouping set is then rolled up from that
+def get_cube_from_frame(df, aggregations=AGGREGATIONS):
+    logging.getLogger().debug("get cube from frame")
+
+    dimensions = get_dimensions(aggregations)
+
+    base = df.groupby(by=dimensions + ['id'], dropna=False, observed=True, sort=False).agg(findings=('Finding ID', 'count'), total_matches=('Total Matches', 'sum')).reset_index()
+
+    cubes = []
+
+    for grouping_set in get_grouping_sets(aggregations):
+        cube = base.groupby(by=list(grouping_set), observed=True).agg(resources=('id', 'nunique'), findings=('findings', 'sum'), total_matches=('total_matches', 'sum')).reset_index()
+
+        cube['grouping_set'] = get_grouping_key(grouping_set)
+
+        cubes.append(cube)
+
+    return pd.concat(cubes, ignore_index=True)[dimensions + MEASURES + ['grouping_set']]
+
+
+#get aggregation, one small frame sliced out of the cube, shaped like the former pandas group bys
+def get_aggregation(cube, dimensions, measure):
+    aggregation = cube.loc[cube['grouping_set'] == get_grouping_key(dimensions), list(dimensions) + [measure]].dropna(subset=list(dimensions))
+
+    return aggregation.rename(columns={measure: 'count'}).sort_values(by=list(dimensions)).reset_index(drop=True)
+
+
+#get aggregations
+def get_aggregations(cube, aggregations=AGGREGATIONS):
+    return {k: get_aggregation(cube, *v) for k, v in aggregations.items()}
+
+
+#get pivot query, summed to the pivot grain so only the pivot sized result leaves the warehouse
+def get_pivot_query(table):
+    columns = ', '.join(f'"{c}"' for c in PIVOT_INDEX + [PIVOT_COLUMNS])
+
+    values = ', '.join(f'sum("{v}") as "{v}"' for v in PIVOT_VALUES)
+
+    return f'select {columns}, {values} from {table} group by {columns}'
+
+
+#get pivot from snowflake
+def get_pivot_from_snowflake(session, table):
+    logging.getLogger().debug(f"get pivot from snowflake: {table}")
+
+    return get_pivot(session.sql(get_pivot_query(table)).to_pandas())
+
+
+#get pivot, from the rows or from rows already summed to the pivot grain, sums of sums are the same
+def get_pivot(df):
+    return df[PIVOT_INDEX + [PIVOT_COLUMNS] + PIVOT_VALUES].pivot_table(values=PIVOT_VALUES, index=PIVOT_INDEX, columns=PIVOT_COLUMNS, aggfunc="sum", observed=True)
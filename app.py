@@ -8,12 +8,17 @@ import logging
 import requests
 import glob
 import os
+import uuid
 import shutil
 
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 
 from datetime import datetime
 
+from collections import defaultdict
+
 from contextlib import closing
 
 import streamlit as st
@@ -26,11 +31,28 @@ from services import ImportService
 
 from harvester import HarvesterService
 
+from preparation import run as run_preparation
+
+from builder import EntryStream, build_entries
+
+from store import Refresher, get_refresher, get_shared_table, get_table_version, lock_file
+
+from schema import ExplodedFindings, compact
+
+from aggregations import get_aggregations, get_cube_from_frame, get_cube_from_snowflake, get_pivot, get_pivot_from_snowflake
+
+from wiz import RetryPolicy, get_wiz_service, get_retry_after, is_rate_limited
+
 import threading
+import queue
+import heapq
+
+from concurrent.futures import ThreadPoolExecutor
 
 from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 
 from snowflake.snowpark import Session
+from snowflake.snowpark.functions import when_matched, when_not_matched
 
 #from streamlit_lottie import st_lottie
 
@@ -41,13 +63,38 @@ from snowflake.snowpark import Session
 MAX_RETRIES_FOR_QUERY = 5
 MAX_RETRIES_FOR_DOWNLOAD_REPORT = 5
 RETRY_TIME_FOR_QUERY = 2
-RETRY_TIME_FOR_DOWNLOAD_REPORT = 60
+MAX_RETRY_TIME_FOR_QUERY = 60
 CHECK_INTERVAL_FOR_DOWNLOAD_REPORT = 20
-
-
-#authentication     
-AUTH0_URLS = ['https://auth.wiz.io/oauth/token', 'https://auth0.gov.wiz.io/oauth/token']
-COGNITO_URLS = ['https://auth.app.wiz.io/oauth/token', 'https://auth.gov.wiz.io/oauth/token']
+INITIAL_INTERVAL_FOR_DOWNLOAD_REPORT = 1
+BACKOFF_FACTOR_FOR_DOWNLOAD_REPORT = 1.5
+DEADLINE_FOR_DOWNLOAD_REPORT = 3600
+CHUNK_SIZE_FOR_DOWNLOAD_REPORT = 50000
+
+
+#resources conf
+RESOURCES_TABLES = ["RESOURCES", "RESOURCES_READY"]
+RESOURCES_WATERMARK_FIELD = 'lastSeen'
+
+
+#report conf
+REPORTS_LOCATION = './reports'
+REPORTS_REGISTRY = f'{REPORTS_LOCATION}/registry.json'
+REPORTS_INGEST_LOCK = f'{REPORTS_LOCATION}/ingest.lock'
+REPORT_MAX_AGE = 3600
+
+DATA_SCAN_REPORT_DTYPES = defaultdict(lambda: str, {
+    'Category': 'category',
+    'Classifier': 'category',
+    'Severity': 'category',
+    'Resource Region': 'category',
+    'Resource Type': 'category',
+    'Resource Cloud Platform': 'category',
+    'Unique Matches': 'Int64',
+    'Total Matches': 'Int64'
+})
+PAGE_SIZE_FOR_RESOURCES = 500
+MAX_WORKERS_FOR_RESOURCES = 4
+MAX_PAGES_IN_FLIGHT_FOR_RESOURCES = 8
 
 
 #get resources query
@@ -95,6 +142,32 @@ GET_RESOURCES_QUERY = (
 )
 
 
+#get resource ids query
+GET_RESOURCE_IDS_QUERY = (
+    """
+      query CloudResourceIds(
+          $filterBy: CloudResourceFilters
+          $first: Int
+          $after: String
+        ) {
+          cloudResources(
+            filterBy: $filterBy
+            first: $first
+            after: $after
+          ) {
+            nodes {
+              id
+            }
+            pageInfo {
+              hasNextPage
+              endCursor
+            }
+          }
+        }
+    """
+)
+
+
 #get report query
 GET_REPORT_QUERY = (
     """
@@ -103,6 +176,10 @@ GET_REPORT_QUERY = (
         nodes {
           id
           name
+          lastRun {
+            status
+            runAt
+          }
         }
         pageInfo {
           hasNextPage
@@ -150,6 +227,7 @@ DOWNLOAD_REPORT_QUERY = (
             lastRun {
                 url
                 status
+                runAt
             }
         }
     }
@@ -184,126 +262,343 @@ def get_config():
     return config
 
 
-#get auth params
-def generate_authentication_params(config):
-    if config['wizio_token_url'] in AUTH0_URLS:
-        return {
-            'grant_type': 'client_credentials',
-            'audience': 'beyond-api',
-            'client_id': config['wizio_client_id'],
-            'client_secret': config['wizio_client_secret']
-        }
-    
-    elif config['wizio_token_url'] in COGNITO_URLS:
-        return {
-            'grant_type': 'client_credentials',
-            'audience': 'wiz-api',
-            'client_id': config['wizio_client_id'],
-            'client_secret': config['wizio_client_secret']
-        }
-    
-    else:
-        raise Exception('Error: wrong token url')
-
-
 #get token
 def get_token(config):
-    response = requests.post(
-        config['wizio_token_url'],
-        headers = {'Content-Type': 'application/x-www-form-urlencoded'},
-        data = generate_authentication_params(config)
-    )
-
-    if response.status_code != requests.codes.ok:
-        raise Exception(f'Error: {response.text}') 
-
-    if not response.json().get('access_token'):
-        raise Exception(f'Error: {response.json().get("message")}')
-
-    config['wizio_token'] = response.json().get('access_token')
+    config['wizio_token'] = get_wiz_service(config).get_token()
 
     return config
 
 
 #send request
 def send_request(config, query, variables):    
-    if config['wizio_token']:
-        return requests.post(
-            config['wizio_api_endpoint_url'],
-            headers = {'Content-Type': 'application/json', 'Authorization': 'Bearer ' + config['wizio_token']},
-            json = {'query': query, 'variables': variables}
-        )
-    
-    raise Exception('Error: wizio_token not found')
+    return get_wiz_service(config).send_request(query, variables)
 
 
 #query
 def query(config, query, variables):
+    policy = RetryPolicy(MAX_RETRIES_FOR_QUERY, RETRY_TIME_FOR_QUERY, MAX_RETRY_TIME_FOR_QUERY)
+
     retries = 0
 
-    response = send_request(config, query, variables)
-    
-    if response.status_code == requests.codes.unauthorized or response.status_code == requests.codes.forbidden:
-        raise Exception(f'Error: {response.text}') 
-    
-    elif response.status_code == requests.codes.not_found:
-        raise Exception(f'Error: {response.text}') 
-    
-    while response.status_code != requests.codes.ok:
-        if retries >= MAX_RETRIES_FOR_QUERY:
+    while True:
+        response = send_request(config, query, variables)
+
+        if response.status_code == requests.codes.unauthorized or response.status_code == requests.codes.forbidden:
             raise Exception(f'Error: {response.text}') 
-        
-        time.sleep(RETRY_TIME_FOR_QUERY)
 
-        response = send_request(config, query, variables)
+        elif response.status_code == requests.codes.not_found:
+            raise Exception(f'Error: {response.text}') 
+
+        errors = None
+
+        if response.status_code == requests.codes.ok:
+            errors = response.json().get('errors')
+
+            if response.json().get('data') or not is_rate_limited(errors):
+                break
+
+        if retries >= policy.max_retries:
+            raise Exception(f'Error: {response.text}') 
+
+        retry_after = get_retry_after(response, errors)
+
+        if retry_after is not None:
+            # hold back every caller sharing the service, not just this one
+            get_wiz_service(config).bucket.pause(retry_after)
+
+        delay = policy.get_delay(retries, retry_after)
+
+        logging.getLogger().debug(f"Info: retry {retries + 1} in {delay:.1f}s status: {response.status_code}")
+
+        time.sleep(delay)
 
         retries += 1
-    
+
     if not response.json().get('data'):
         raise Exception(f'Error: {response.json().get("errors")}')
-   
+
     logging.getLogger().debug(f"Info: {response.json().get('data')}")
-    
+
     return response.json().get('data')
 
 
+#get resources page
+def get_resources_page(config, variables, after, resources_query=GET_RESOURCES_QUERY):
+    response = query(config, resources_query, {**variables, 'after': after})
+
+    return response['cloudResources']
+
+
+#iter resources pages, the next page request is in flight while the current one is processed
+def iter_resources_pages(config, variables, resources_query=GET_RESOURCES_QUERY):
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        future = executor.submit(get_resources_page, config, variables, None, resources_query)
+
+        while future is not None:
+            page = future.result()
+
+            future = None
+
+            if page['pageInfo']['hasNextPage']:
+                future = executor.submit(get_resources_page, config, variables, page['pageInfo']['endCursor'], resources_query)
+
+            yield page['nodes']
+
+
+#get resources shards, each shard is an extra filterBy applied on top of the project filter
+def get_resources_shards(config, project_id, shards=None):
+    shards = shards or config.get('wizio_resources_shards') or [{}]
+
+    return [{"first": PAGE_SIZE_FOR_RESOURCES, "filterBy": {"projectId": [project_id], **shard}} for shard in shards]
+
+
+#iter resources, shards are paged in parallel and nodes are yielded as pages arrive
+def iter_resources(config, project_id, shards=None, resources_query=GET_RESOURCES_QUERY):
+    logging.getLogger().debug("iter resources")
+
+    variables = get_resources_shards(config, project_id, shards)
+
+    if len(variables) == 1:
+        for nodes in iter_resources_pages(config, variables[0], resources_query):
+            yield from nodes
+
+        return
+
+    pages = queue.Queue(maxsize=MAX_PAGES_IN_FLIGHT_FOR_RESOURCES)
+
+    stop = threading.Event()
+
+    done = object()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                pages.put(item, timeout=1)
+
+                return True
+
+            except queue.Full:
+                pass
+
+        return False
+
+    def page_shard(shard_variables):
+        if stop.is_set():
+            return
+
+        try:
+            for nodes in iter_resources_pages(config, shard_variables, resources_query):
+                if not put(nodes):
+                    return
+
+        except Exception as error:
+            put(error)
+
+        finally:
+            put(done)
+
+    with ThreadPoolExecutor(max_workers=min(MAX_WORKERS_FOR_RESOURCES, len(variables))) as executor:
+        _ = [executor.submit(page_shard, v) for v in variables]
+
+        try:
+            remaining = len(variables)
+
+            while remaining:
+                item = pages.get()
+
+                if item is done:
+                    remaining -= 1
+
+                elif isinstance(item, Exception):
+                    raise item
+
+                else:
+                    yield from item
+
+        finally:
+            stop.set()
+
+
 #get resources
-def get_resources(config, project_id):
+def get_resources(config, project_id, shards=None):
     logging.getLogger().debug("get resources")
 
+    return list(iter_resources(config, project_id, shards))
+
+
+#get report name, stable per project so the same report definition is found again on every refresh
+def get_report_name(report_prefix, project_id):
+    return re.sub(' |\.|:|-','', f'{report_prefix}_{project_id}')
+
+
+#find report
+def find_report(config, project_id, report_name, report_type):
     variables = {
-        "first": 500,
+        "first": 100,
         "filterBy": {
             "projectId": [
                 project_id
             ],
+            "type": [
+                report_type
+            ],
+            "search": report_name
         }
     }
-    
-    nodes = []
 
     while True:
-        response = query(config, GET_RESOURCES_QUERY, variables)
+        response = query(config, GET_REPORT_QUERY, variables)
 
-        try:
-            nodes = nodes + response['cloudResources']['nodes']
+        report = next(filter(lambda r: r['name'] == report_name, response['reports']['nodes']), None)
 
-            variables['after'] = response['cloudResources']['pageInfo']['endCursor']
+        if report or not response['reports']['pageInfo']['hasNextPage']:
+            return report
 
-            if response['cloudResources']['pageInfo']['hasNextPage'] == False:
-                break
+        variables['after'] = response['reports']['pageInfo']['endCursor']
 
-        except Exception as error:
-            break
-            
-    return nodes
+
+#is report stale
+def is_report_stale(report, max_age=REPORT_MAX_AGE):
+    last_run = report.get('lastRun') or {}
+
+    if last_run.get('status') != 'COMPLETED' or not last_run.get('runAt'):
+        return last_run.get('status') is None
+
+    run_at = datetime.fromisoformat(last_run['runAt'].replace('Z', '+00:00'))
+
+    return (datetime.now(run_at.tzinfo) - run_at).total_seconds() > max_age
+
+
+#get report key, registry entries are per project and report type
+def get_report_key(project_id, report_type):
+    return f"{project_id}/{report_type}"
+
+
+#get report registry
+def get_report_registry():
+    try:
+        with open(REPORTS_REGISTRY, "r") as f:
+            return json.load(f)
+
+    except Exception:
+        return {}
+
+
+#set report registry
+def set_report_registry(registry):
+    os.makedirs(REPORTS_LOCATION, exist_ok=True)
+
+    tmp = f"{REPORTS_REGISTRY}.{os.getpid()}.{uuid.uuid4().hex}.tmp"
+
+    with open(tmp, "w") as f:
+        json.dump(registry, f)
+
+    os.replace(tmp, REPORTS_REGISTRY)
+
+
+#get resources frame
+def get_resources_frame(nodes, watermark_field=RESOURCES_WATERMARK_FIELD):
+    resources_df = pd.DataFrame(nodes)
+
+    if resources_df.empty:
+        return resources_df
+
+    resources_df['externalId'] = resources_df['graphEntity'].apply(get_external_id)
+
+    resources_df['firstSeen'] = resources_df['graphEntity'].apply(lambda x: (x or {}).get('firstSeen'))
+
+    resources_df['lastSeen'] = resources_df['graphEntity'].apply(lambda x: (x or {}).get('lastSeen'))
+
+    # the watermark is read back from this column, so it holds the field the incremental listing filters on
+    if watermark_field not in resources_df:
+        resources_df[watermark_field] = resources_df['graphEntity'].apply(lambda x: (x or {}).get(watermark_field))
+
+    resources_df['_deleted'] = False
+
+    return resources_df
+
+
+#get resources watermark, the newest value of the watermark field already merged into the table
+def get_resources_watermark(session, table, watermark_field=RESOURCES_WATERMARK_FIELD):
+    try:
+        return session.sql(f'select max("{watermark_field}") from {table}').collect()[0][0]
+
+    except Exception as error:
+        logging.getLogger().debug(f"get resources watermark: {error}")
+
+        return None
+
+
+#merge resources, upsert by id
+def merge_resources(session, table, resources_df):
+    session.write_pandas(resources_df, f"{table}_DELTA", auto_create_table=True, overwrite=True)
+
+    target = session.table(table)
+
+    source = session.table(f"{table}_DELTA")
+
+    columns = {f'"{c}"': source[f'"{c}"'] for c in resources_df.columns}
+
+    return target.merge(source, target['"id"'] == source['"id"'], [when_matched().update(columns), when_not_matched().insert(columns)])
+
+
+#tombstone resources no longer present in the project, resources listed again are restored, returns the rows changed
+def tombstone_resources(session, table, ids_df):
+    session.write_pandas(ids_df, f"{table}_IDS", auto_create_table=True, overwrite=True)
+
+    restored = session.sql(f'update {table} set "_deleted" = false where "_deleted" = true and "id" in (select "id" from {table}_IDS)').collect()
+
+    tombstoned = session.sql(f'update {table} set "_deleted" = true where "_deleted" = false and "id" not in (select "id" from {table}_IDS)').collect()
+
+    return restored[0][0] + tombstoned[0][0]
+
+
+#refresh resources, incremental from the stored watermark, full when there is none, the watermark and the filter use the
+#same field, returns the resources merged, tombstoned or restored
+def refresh_resources(config, session, incremental=True, tables=RESOURCES_TABLES):
+    logging.getLogger().debug("refresh resources")
+
+    project_id = config['wizio_project_id']
+
+    watermark_field = config.get('wizio_resources_watermark_field', RESOURCES_WATERMARK_FIELD)
+
+    watermark = get_resources_watermark(session, tables[0], watermark_field) if incremental else None
+
+    if watermark is None:
+        resources_df = get_resources_frame(get_resources(config, project_id), watermark_field)
+
+        _ = [session.write_pandas(resources_df, table, auto_create_table=True, overwrite=True) for table in tables]
+
+        return len(resources_df)
+
+    logging.getLogger().debug(f"refresh resources: watermark {watermark}")
+
+    watermark_filter = {watermark_field: {"after": watermark}}
+
+    shards = [{**shard, **watermark_filter} for shard in config.get('wizio_resources_shards') or [{}]]
+
+    resources_df = get_resources_frame(get_resources(config, project_id, shards), watermark_field)
+
+    ids_df = pd.DataFrame({'id': [node['id'] for node in iter_resources(config, project_id, resources_query=GET_RESOURCE_IDS_QUERY)]})
+
+    changed = len(resources_df)
+
+    for table in tables:
+        if not resources_df.empty:
+            merge_resources(session, table, resources_df)
+
+        # an empty listing is far more likely a failed call than an empty project
+        if not ids_df.empty:
+            changed += tombstone_resources(session, table, ids_df)
+
+    return changed
 
 
 #create report
-def create_report(config, project_id, report_prefix, report_type):
+def create_report(config, project_id, report_prefix, report_type, report_name=None):
     variables = {
         "input": {
-            "name": re.sub(' |\.|:|-','', f'{report_prefix}_{datetime.now()}'),
+            "name": report_name or re.sub(' |\.|:|-','', f'{report_prefix}_{datetime.now()}'),
             "type": report_type,
             "projectId": project_id
         }
@@ -329,28 +624,87 @@ def rerun_report(config, report_id):
     return report_id
 
 
-#get report url and status
-def get_report_url_and_status(config, report_id):
-    num_of_retries = 0
+#is newer run, whether a last run started after the given run at, either one unknown counts as newer
+def is_newer_run(last_run, run_at):
+    if not run_at or not last_run.get('runAt'):
+        return True
+
+    return datetime.fromisoformat(last_run['runAt'].replace('Z', '+00:00')) > datetime.fromisoformat(run_at.replace('Z', '+00:00'))
+
+
+#wait for reports, returns the last run of each, polls every report from one loop, each on its own geometric schedule capped at CHECK_INTERVAL_FOR_DOWNLOAD_REPORT,
+#a report rerun by the caller passes the run it replaced in after, only a completed run newer than that one is returned
+def wait_for_reports(config, report_ids, deadline=DEADLINE_FOR_DOWNLOAD_REPORT, after=None):
+    logging.getLogger().debug(f"wait for reports: {report_ids}")
+
+    started = time.monotonic()
+
+    intervals = {report_id: INITIAL_INTERVAL_FOR_DOWNLOAD_REPORT for report_id in report_ids}
+
+    num_of_retries = {report_id: 0 for report_id in report_ids}
 
-    while num_of_retries < MAX_RETRIES_FOR_DOWNLOAD_REPORT:
-        time.sleep(CHECK_INTERVAL_FOR_DOWNLOAD_REPORT)
+    # the failed run each rerun replaced, lastRun keeps reporting it until the new run starts, it is not counted twice,
+    # cleared once the new run shows up so a failure without a runAt is still counted once per rerun
+    rerun_of = {}
+
+    schedule = [(started + INITIAL_INTERVAL_FOR_DOWNLOAD_REPORT, report_id) for report_id in report_ids]
+
+    heapq.heapify(schedule)
+
+    last_runs = {}
+
+    while schedule:
+        due, report_id = heapq.heappop(schedule)
+
+        if due - started > deadline:
+            raise Exception(f'Error: get report fail, deadline exceeded: {report_id}')
+
+        time.sleep(max(due - time.monotonic(), 0))
 
         response = query(config, DOWNLOAD_REPORT_QUERY, {'reportId': report_id})
 
-        status = response['report']['lastRun']['status']
+        # no last run yet is pending
+        last_run = response['report'].get('lastRun') or {}
 
-        if status == 'COMPLETED':
-            return response['report']['lastRun']['url']
-        
-        elif status == 'FAILED' or status == 'EXPIRED':
-            rerun_report(report_id)
+        status = last_run.get('status')
 
-            time.sleep(RETRY_TIME_FOR_DOWNLOAD_REPORT)
+        failed = status == 'FAILED' or status == 'EXPIRED'
 
-            num_of_retries += 1
+        if not failed and status is not None:
+            rerun_of.pop(report_id, None)
 
-    raise Exception('Error: get report fail')
+        # right after a rerun lastRun is still the completed run it replaced, that one is pending
+        replaced = status == 'COMPLETED' and not is_newer_run(last_run, (after or {}).get(report_id))
+
+        if status == 'COMPLETED' and not replaced:
+            last_runs[report_id] = last_run
+
+            continue
+
+        elif failed and (report_id not in rerun_of or (last_run.get('runAt') is not None and last_run.get('runAt') != rerun_of[report_id])):
+            if num_of_retries[report_id] >= MAX_RETRIES_FOR_DOWNLOAD_REPORT:
+                raise Exception(f'Error: get report fail: {report_id}')
+
+            rerun_report(config, report_id)
+
+            num_of_retries[report_id] += 1
+
+            rerun_of[report_id] = last_run.get('runAt')
+
+            # a new run takes a while, polling restarts from the cap instead of the initial interval
+            intervals[report_id] = CHECK_INTERVAL_FOR_DOWNLOAD_REPORT
+
+        else:
+            intervals[report_id] = min(intervals[report_id] * BACKOFF_FACTOR_FOR_DOWNLOAD_REPORT, CHECK_INTERVAL_FOR_DOWNLOAD_REPORT)
+
+        heapq.heappush(schedule, (time.monotonic() + intervals[report_id], report_id))
+
+    return last_runs
+
+
+#get report url and status
+def get_report_url_and_status(config, report_id):
+    return wait_for_reports(config, [report_id])[report_id]['url']
 
 
 #get report content
@@ -377,7 +731,69 @@ def get_report_content_to_dataframe(download_url):
     return pd.read_csv(download_url)    
 
 
-#get report
+#get report schema, pins dictionary index width and untyped columns so every chunk shares one parquet schema
+def get_report_schema(table):
+    fields = []
+
+    for f in table.schema:
+        if pa.types.is_null(f.type):
+            f = f.with_type(pa.string())
+
+        elif pa.types.is_dictionary(f.type):
+            f = f.with_type(pa.dictionary(pa.int32(), pa.string()))
+
+        fields.append(f)
+
+    return pa.schema(fields, metadata=table.schema.metadata)
+
+
+#get report content to parquet, streams the csv and writes one row group per chunk
+def get_report_content_to_parquet(download_url, path, dtype=DATA_SCAN_REPORT_DTYPES, chunksize=CHUNK_SIZE_FOR_DOWNLOAD_REPORT):
+    logging.getLogger().debug(f"get report content to parquet: {path}")
+
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+
+    writer = None
+
+    schema = None
+
+    # unique per writer, replicas downloading the same report never share a temporary file
+    tmp = f"{path}.{os.getpid()}.{uuid.uuid4().hex}.tmp"
+
+    with closing(requests.get(download_url, stream=True)) as r:
+        if r.status_code != requests.codes.ok:
+            raise Exception(f'Error: download failed {r.status_code}')
+
+        r.raw.decode_content = True
+
+        try:
+            for chunk in pd.read_csv(r.raw, dtype=dtype, chunksize=chunksize):
+                if schema is None:
+                    schema = get_report_schema(pa.Table.from_pandas(chunk, preserve_index=False))
+
+                    writer = pq.ParquetWriter(tmp, schema)
+
+                writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+
+        except Exception:
+            if writer is not None:
+                writer.close()
+
+                os.remove(tmp)
+
+            raise
+
+    if writer is None:
+        raise Exception('Error: download failed')
+
+    writer.close()
+
+    os.replace(tmp, path)
+
+    return path
+
+
+#get report, reruns the project report definition when stale and downloads only runs newer than the local copy
 def get_report(config, project_id):    
     logging.getLogger().debug("get report")
     
@@ -385,12 +801,45 @@ def get_report(config, project_id):
     
     report_type= "DATA_SCAN"
 
-    report_id = create_report(config, project_id, report_type, report_type)
+    report_name = get_report_name(report_type, project_id)
 
-    report_url = get_report_url_and_status(config, report_id)
-    
-    #report_data[report_type] = get_report_content(report_url)
-    report_data[report_type] = get_report_content_to_dataframe(report_url)
+    report = find_report(config, project_id, report_name, report_type)
+
+    # the run a rerun replaces, it stays the last run until the new one starts
+    after = {}
+
+    if report is None:
+        report_id = create_report(config, project_id, report_type, report_type, report_name)
+
+    elif is_report_stale(report, config.get('wizio_report_max_age', REPORT_MAX_AGE)):
+        report_id = rerun_report(config, report['id'])
+
+        after[report_id] = (report.get('lastRun') or {}).get('runAt')
+
+    else:
+        report_id = report['id']
+
+    last_run = wait_for_reports(config, [report_id], after=after)[report_id]
+
+    registry = get_report_registry()
+
+    report_key = get_report_key(project_id, report_type)
+
+    cached = registry.get(report_key, {})
+
+    if cached.get('id') != report_id or cached.get('runAt') != last_run.get('runAt') or not os.path.exists(cached.get('path', '')):
+        logging.getLogger().debug(f"get report: downloading run {last_run.get('runAt')}")
+
+        #report_data[report_type] = get_report_content(last_run['url'])
+        #report_data[report_type] = get_report_content_to_dataframe(last_run['url'])
+        path = get_report_content_to_parquet(last_run['url'], f"{REPORTS_LOCATION}/{report_name}.parquet")
+
+        cached = {"id": report_id, "runAt": last_run.get('runAt'), "path": path}
+
+        # read again, entries of other projects may have been written during the download
+        set_report_registry({**get_report_registry(), report_key: cached})
+
+    report_data[report_type] = cached['path']
 
     return report_data
 
@@ -417,81 +866,211 @@ def get_number_of_findings(x):
         return None
     
 
-#get data findings
-@st.cache_resource
-def get_data_findings(config):
-    logging.getLogger().debug("get data findings")
-
-    config= get_token(config)
+#load data findings, with the aggregations pushed down the dashboard never reads the ready rows, they are left in the
+#warehouse until a registration needs them
+def load_data_findings(session, pushdown=False):
+    logging.getLogger().debug("load data findings")
 
-    session = st.connection("snowflake").session()
     #session = Session.builder.config("connection_name", "wizio").create()
 
-    # resources_df = pd.DataFrame(get_resources(config, config['wizio_project_id']) )
+    # resources_df = session.table("RESOURCES_READY").filter('not "_deleted"').to_pandas()
 
-    # session.write_pandas(resources_df, "RESOURCES", auto_create_table=True, overwrite=True)
+    # reports = get_report(config, config['wizio_project_id']) 
 
-    # resources_df = session.table("RESOURCES").to_pandas()
+    # data_scan_df = pd.read_parquet(reports['DATA_SCAN'])
 
-    # resources_df['externalId'] = resources_df['graphEntity'].apply(get_external_id)
+    # session.write_pandas(data_scan_df, "DATA_SCAN", auto_create_table=True, overwrite=True)
 
-    # session.write_pandas(resources_df, "RESOURCES_READY", auto_create_table=True, overwrite=True)
+    # data_scan_df = session.table("DATA_SCAN").to_pandas()
 
-    # resources_ready_df = session.table("RESOURCES_READY").to_pandas()
+    # data_scan_resources_ready_df, data_scan_resources_exploded_df = prepare(data_scan_df, resources_df)
 
-    # reports = get_report(config, config['wizio_project_id']) 
+    # session.write_pandas(data_scan_resources_ready_df, "DATA_SCAN_RESOURCES_READY", auto_create_table=True, overwrite=True)
 
-    # data_scan_df = reports['DATA_SCAN']
+    # session.write_pandas(data_scan_resources_exploded_df, "DATA_SCAN_RESOURCES_EXPLODED", auto_create_table=True, overwrite=True)    
 
-    # session.write_pandas(data_scan_df, "DATA_SCAN", auto_create_table=True, overwrite=True)
+    data_scan_resources_ready_df = None if pushdown else get_data_findings_ready(session)
 
-    # data_scan_df = session.table("DATA_SCAN").to_pandas()
+    data_scan_resources_exploded_df = get_shared_table(session, "DATA_SCAN_RESOURCES_EXPLODED", lambda df: ExplodedFindings.from_frame(df).to_parts(), ExplodedFindings.from_parts)
 
-    # data_scan_resources_df = data_scan_df.set_index('Resource External ID').join(resources_df.set_index('externalId'))
+    return data_scan_resources_ready_df, data_scan_resources_exploded_df
 
-    # data_scan_resources_df.reset_index(inplace=True)
 
-    # session.write_pandas(data_scan_resources_df, "DATA_SCAN_RESOURCES", auto_create_table=True, overwrite=True)
+#load report, the parquet is staged and loaded by the warehouse, it never goes through pandas
+def load_report(session, path, table):
+    logging.getLogger().debug(f"load report: {path} into {table}")
 
-    # data_scan_resources_df = session.table("DATA_SCAN_RESOURCES").to_pandas()
+    session.sql(f"create temporary stage if not exists {table}_STAGE").collect()
 
-    # data_scan_resources_ready_df = pd.json_normalize(data_scan_resources_df['graphEntity'])
+    session.file.put(path, f"@{table}_STAGE", auto_compress=False, overwrite=True)
 
-    # data_scan_resources_ready_df[['Finding ID', 'Category', 'Classifier', 'Unique Matches', 'Total Matches', 'Severity', 'Finding Examples']] = data_scan_resources_df[['ID', 'Category', 'Classifier', 'Unique Matches', 'Total Matches', 'Severity', 'Finding Examples']]
+    session.read.parquet(f"@{table}_STAGE/{os.path.basename(path)}").write.mode("overwrite").save_as_table(table)
 
-    # data_scan_resources_ready_df = data_scan_resources_ready_df.rename(lambda x: x.replace('properties.','_'), axis='columns')
 
-    # data_scan_resources_ready_df['Examples Count'] = data_scan_resources_ready_df['Finding Examples'].apply(get_number_of_findings)
+#get ingested run, the report run the findings tables were last prepared from, kept on the report table itself so every
+#process and replica sees it
+def get_ingested_run(session, table="DATA_SCAN"):
+    try:
+        row = session.sql(f"select comment from information_schema.tables where table_schema = current_schema() and table_name = '{table}'").collect()
 
-    # data_scan_resources_ready_df['_creationYYMM']=data_scan_resources_ready_df['_creationDate'].str[0:7]
+        return row[0][0] if row else None
 
-    # data_scan_resources_ready_df.to_csv('datascanresourcesready.csv', index=False)
+    except Exception as error:
+        logging.getLogger().warning(f"get ingested run: {table} {error}")
 
-    # data_scan_resources_ready_df = pd.read_csv('datascanresourcesready.csv')  
+        return None
 
-    # session.write_pandas(data_scan_resources_ready_df, "DATA_SCAN_RESOURCES_READY", auto_create_table=True, overwrite=True)
 
-    data_scan_resources_ready_df = session.table("DATA_SCAN_RESOURCES_READY").to_pandas()
+#get data findings ready
+def get_data_findings_ready(session):
+    return get_shared_table(session, "DATA_SCAN_RESOURCES_READY", lambda df: {"table": compact(df)})
 
-    # data_scan_resources_exploded_df = data_scan_resources_ready_df.query("type in ('BUCKET', 'DATABASE', 'DB_SERVER')")
 
-    # data_scan_resources_exploded_df['Finding Examples'] = data_scan_resources_exploded_df['Finding Examples'].apply(lambda x: eval(x) if x is not None else None)
+#ingest data findings, resources merged from the watermark and the scan report downloaded when it has a new run, the
+#findings tables are prepared again when either changed, one process of the host at a time, returns the report run
+def ingest_data_findings(config, session):
+    with lock_file(REPORTS_INGEST_LOCK, blocking=False) as locked:
+        if not locked:
+            logging.getLogger().info("ingest data findings: running in another process")
 
-    # columns=['id', 'name', 'type', '_cloudPlatform', '_subscriptionExternalId', '_region', '_creationDate', '_externalId', 'Finding ID', 'Category', 'Classifier', 'Finding Examples']
+            return None
 
-    # data_scan_resources_exploded_df = data_scan_resources_exploded_df[columns].explode('Finding Examples', ignore_index=True)
+        logging.getLogger().debug("ingest data findings")
 
-    # exploded_df = pd.json_normalize(data_scan_resources_exploded_df['Finding Examples'])
+        config = get_token(dict(config))
 
-    # columns=['id', 'name', 'type', '_cloudPlatform', '_subscriptionExternalId', '_region', '_creationDate', '_externalId', 'Finding ID', 'Category', 'Classifier']
-     
-    # data_scan_resources_exploded_df = pd.concat([data_scan_resources_exploded_df[columns], exploded_df[['key', 'path']]], axis=1)
+        project_id = config['wizio_project_id']
 
-    # session.write_pandas(data_scan_resources_exploded_df, "DATA_SCAN_RESOURCES_EXPLODED", auto_create_table=True, overwrite=True)    
+        changed = refresh_resources(config, session, incremental=True)
 
-    data_scan_resources_exploded_df = session.table("DATA_SCAN_RESOURCES_EXPLODED").to_pandas()
+        reports = get_report(config, project_id)
 
-    return data_scan_resources_ready_df, data_scan_resources_exploded_df
+        run_at = get_report_registry().get(get_report_key(project_id, "DATA_SCAN"), {}).get('runAt')
+
+        if changed or run_at != get_ingested_run(session):
+            load_report(session, reports['DATA_SCAN'], "DATA_SCAN")
+
+            run_preparation(session)
+
+            # written last, a failed preparation is retried on the next ingest
+            session.sql(f"comment on table DATA_SCAN is '{run_at}'").collect()
+
+        return run_at
+
+
+#probe data findings, the snowflake versions of both findings tables
+def probe_data_findings(session):
+    versions = [get_table_version(session, table) for table in ["DATA_SCAN_RESOURCES_READY", "DATA_SCAN_RESOURCES_EXPLODED"]]
+
+    return None if None in versions else "|".join(versions)
+
+
+#get data findings ingester, ingests in the background every wizio_ingest_interval seconds, opt in, meant for the one
+#replica that prepares the findings tables, the others only read them
+def get_data_findings_ingester(config):
+    interval = config.get('wizio_ingest_interval')
+
+    if not interval:
+        return None
+
+    def create():
+        session, snapshot = st.connection("snowflake").session(), dict(config)
+
+        return Refresher(lambda: ingest_data_findings(snapshot, session), None, interval)
+
+    return get_refresher("data findings ingester", ("snowflake", config['wizio_client_id'], config['wizio_project_id'], interval), create)
+
+
+#get data findings refresher, one per process, reloads in the background and keeps serving the previous version meanwhile,
+#the session is created here in the script run and handed to the thread
+def get_data_findings_refresher(config):
+    logging.getLogger().debug("get data findings refresher")
+
+    get_data_findings_ingester(config)
+
+    interval, pushdown = config.get('data_findings_refresh_interval', 60), config.get('dashboard_aggregations_pushdown', False)
+
+    def create():
+        session = st.connection("snowflake").session()
+
+        return Refresher(lambda: load_data_findings(session, pushdown), lambda: probe_data_findings(session), interval)
+
+    return get_refresher("data findings", ("snowflake", interval, pushdown), create)
+
+
+#get data findings, None until the first load is done
+def get_data_findings(config):
+    logging.getLogger().debug("get data findings")
+
+    return get_data_findings_refresher(config).get(timeout=0)
+
+
+#get data findings version, of the ready rows when loaded, else what the refresher probed
+def get_data_findings_version(config, data_findings):
+    if data_findings[0] is not None and data_findings[0].attrs.get('version'):
+        return data_findings[0].attrs['version']
+
+    return get_data_findings_refresher(config).version or id(data_findings)
+
+
+#get dashboard aggregations, built once per data version and shared by every session and rerun
+@st.cache_resource(max_entries=2)
+def get_dashboard_aggregations(version, pushdown, _data_scan_resources_ready_df):
+    logging.getLogger().debug(f"get dashboard aggregations: {version}")
+
+    if pushdown:
+        return get_aggregations(get_cube_from_snowflake(st.connection("snowflake").session(), "DATA_SCAN_RESOURCES_READY"))
+
+    return get_aggregations(get_cube_from_frame(_data_scan_resources_ready_df))
+
+
+#get dashboard pivot, the playground, built once per data version, summed in the warehouse when pushed down
+@st.cache_resource(max_entries=2)
+def get_dashboard_pivot(version, pushdown, _data_scan_resources_ready_df):
+    logging.getLogger().debug(f"get dashboard pivot: {version}")
+
+    if pushdown:
+        return get_pivot_from_snowflake(st.connection("snowflake").session(), "DATA_SCAN_RESOURCES_READY")
+
+    return get_pivot(_data_scan_resources_ready_df)
+
+
+#get dashboard examples, the exploded findings expanded once per data version, shared by every session and rerun
+@st.cache_resource(max_entries=1)
+def get_dashboard_examples(version, _data_scan_resources_exploded_df):
+    logging.getLogger().debug(f"get dashboard examples: {version}")
+
+    return _data_scan_resources_exploded_df.to_frame()
+
+
+#get chart specs, shared by every session and rerun, holds the specs of a single data version
+@st.cache_resource
+def get_chart_specs():
+    return {"version": None, "specs": {}, "lock": threading.Lock()}
+
+
+#show chart, builds and serializes the chart only when its (chart id, data version) is not cached yet
+def show_chart(chart_id, version, build):
+    chart_specs = get_chart_specs()
+
+    with chart_specs['lock']:
+        if chart_specs['version'] != version:
+            chart_specs['version'] = version
+
+            chart_specs['specs'] = {}
+
+        spec = chart_specs['specs'].get(chart_id)
+
+    if spec is None:
+        logging.getLogger().debug(f"show chart: {chart_id} {version} render")
+
+        spec = build().to_dict()
+
+        with chart_specs['lock']:
+            if chart_specs['version'] == version:
+                chart_specs['specs'][chart_id] = spec
+
+    st.vega_lite_chart(spec, use_container_width=True)
 
 
 #show dashboard
@@ -510,46 +1089,64 @@ def show_dashboard(config):
             </style>
         """
 
-        data_scan_resources_ready_df, data_scan_resources_exploded_df = get_data_findings(config)
+        data_findings = get_data_findings(config)
+
+        # the first load runs in the background, the page reruns until it is done
+        if data_findings is None:
+            st.info("Loading data findings...")
+
+            time.sleep(1)
+
+            st.rerun()
 
-        resources_per_cloud_platform = data_scan_resources_ready_df[['_cloudPlatform','id']].drop_duplicates().groupby(by=['_cloudPlatform']).count().reset_index().rename(columns={"id": "count"})
+        data_scan_resources_ready_df, data_scan_resources_exploded_df = data_findings
 
-        resources_per_environment = data_scan_resources_ready_df[['__environments','id']].drop_duplicates().groupby(by=['__environments']).count().reset_index().rename(columns={"id": "count"})
+        version = get_data_findings_version(config, data_findings)
 
-        resources_per_status = data_scan_resources_ready_df[['_status','id']].drop_duplicates().groupby(by=['_status']).count().reset_index().rename(columns={"id": "count"})
+        aggregations = get_dashboard_aggregations(version, config.get('dashboard_aggregations_pushdown', False), data_scan_resources_ready_df)
 
-        resources_per_region = data_scan_resources_ready_df[['_region','id']].drop_duplicates().groupby(by=['_region']).count().reset_index().rename(columns={"id": "count"})
+        resources_per_cloud_platform = aggregations['resources_per_cloud_platform']
 
-        resources_per_type = data_scan_resources_ready_df[['type','id']].drop_duplicates().groupby(by=['type']).count().reset_index().rename(columns={"id": "count"})
+        resources_per_environment = aggregations['resources_per_environment']
 
-        resources_per_creation_date = data_scan_resources_ready_df[['_creationYYMM','id']].drop_duplicates().groupby(by=['_creationYYMM']).count().reset_index().rename(columns={"id": "count"})
+        resources_per_status = aggregations['resources_per_status']
 
-        resources_per_category = data_scan_resources_ready_df[['Category','id']].drop_duplicates().groupby(by=['Category']).count().reset_index().rename(columns={"id": "count"})
+        resources_per_region = aggregations['resources_per_region']
 
-        resources_per_severity = data_scan_resources_ready_df[['Severity','id']].drop_duplicates().groupby(by=['Severity']).count().reset_index().rename(columns={"id": "count"})
+        resources_per_type = aggregations['resources_per_type']
 
-        findings_per_region = data_scan_resources_ready_df[['_region','Finding ID']].groupby(by=['_region']).count().reset_index().rename(columns={"Finding ID": "count"})
+        resources_per_creation_date = aggregations['resources_per_creation_date']
 
-        findings_per_type = data_scan_resources_ready_df[['type','Finding ID']].groupby(by=['type']).count().reset_index().rename(columns={"Finding ID": "count"})
+        resources_per_category = aggregations['resources_per_category']
 
-        findings_per_classifier = data_scan_resources_ready_df[['Classifier','Finding ID']].groupby(by=['Classifier']).count().reset_index().rename(columns={"Finding ID": "count"})
+        resources_per_severity = aggregations['resources_per_severity']
 
-        findings_per_type_and_severity = data_scan_resources_ready_df[['type', 'Severity', 'Finding ID']].groupby(by=['type','Severity']).count().reset_index().rename(columns={"Finding ID": "count"})
+        findings_per_region = aggregations['findings_per_region']
 
-        findings_per_type_and_classifier = data_scan_resources_ready_df[['type', 'Classifier', 'Finding ID']].groupby(by=['type','Classifier']).count().reset_index().rename(columns={"Finding ID": "count"})
+        findings_per_type = aggregations['findings_per_type']
 
-        total_matches_per_region = data_scan_resources_ready_df[['_region','Total Matches']].groupby(by=['_region']).sum().reset_index().rename(columns={"Total Matches": "count"})
+        findings_per_classifier = aggregations['findings_per_classifier']
 
-        total_matches_per_type = data_scan_resources_ready_df[['type','Total Matches']].groupby(by=['type']).sum().reset_index().rename(columns={"Total Matches": "count"})
+        findings_per_type_and_severity = aggregations['findings_per_type_and_severity']
 
-        total_matches_per_classifier = data_scan_resources_ready_df[['Classifier','Total Matches']].groupby(by=['Classifier']).sum().reset_index().rename(columns={"Total Matches": "count"})
+        findings_per_type_and_classifier = aggregations['findings_per_type_and_classifier']
 
-        total_matches_per_type_and_severity = data_scan_resources_ready_df[['type', 'Severity', 'Total Matches']].groupby(by=['type','Severity']).sum().reset_index().rename(columns={"Total Matches": "count"})
+        total_matches_per_region = aggregations['total_matches_per_region']
 
-        total_matches_per_type_and_classifier = data_scan_resources_ready_df[['type', 'Classifier', 'Total Matches']].groupby(by=['type','Classifier']).sum().reset_index().rename(columns={"Total Matches": "count"})
+        total_matches_per_type = aggregations['total_matches_per_type']
+
+        total_matches_per_classifier = aggregations['total_matches_per_classifier']
+
+        total_matches_per_type_and_severity = aggregations['total_matches_per_type_and_severity']
+
+        total_matches_per_type_and_classifier = aggregations['total_matches_per_type_and_classifier']
 
         st.write(time.strftime("%Y-%m-%d %H:%M:%S")) 
 
+        refresher = get_data_findings_refresher(config)
+
+        st.caption(f"Data version {refresher.version}, loaded {int(refresher.get_age() or 0)}s ago")
+
         st.markdown(style, unsafe_allow_html=True)
 
         st.subheader("General Dashboard")
@@ -579,7 +1176,7 @@ def show_dashboard(config):
               .properties(title='Number of resources per date')
          )
 
-        st.altair_chart((c.mark_bar() + c.mark_text(align='center', dy=-10)).configure_axis(grid=False).configure_view(strokeWidth=0), use_container_width=True)
+        show_chart("resources_per_creation_date", version, lambda: (c.mark_bar() + c.mark_text(align='center', dy=-10)).configure_axis(grid=False).configure_view(strokeWidth=0))
 
         st.write("#")
 
@@ -602,7 +1199,7 @@ def show_dashboard(config):
                 .properties(title='Number of resources per region')
             )
 
-            st.altair_chart((c.mark_bar() + c.mark_text(align='center', dy=-10)).configure_axis(grid=False).configure_view(strokeWidth=0), use_container_width=True)
+            show_chart("resources_per_region", version, lambda: (c.mark_bar() + c.mark_text(align='center', dy=-10)).configure_axis(grid=False).configure_view(strokeWidth=0))
 
         with col3:
             c = (alt.Chart(resources_per_type)
@@ -610,7 +1207,7 @@ def show_dashboard(config):
                 .properties(title='Number of resources per type')
             )
 
-            st.altair_chart((c.mark_bar() + c.mark_text(align='center', dy=-10)).configure_axis(grid=False).configure_view(strokeWidth=0), use_container_width=True)
+            show_chart("resources_per_type", version, lambda: (c.mark_bar() + c.mark_text(align='center', dy=-10)).configure_axis(grid=False).configure_view(strokeWidth=0))
 
         st.write("#")
 
@@ -623,7 +1220,7 @@ def show_dashboard(config):
                 .properties(title='Number of resources per severity')
             )
                     
-            st.altair_chart((c.mark_bar() + c.mark_text(align='center', dy=-10)).configure_axis(grid=False).configure_view(strokeWidth=0), use_container_width=True) 
+            show_chart("resources_per_severity", version, lambda: (c.mark_bar() + c.mark_text(align='center', dy=-10)).configure_axis(grid=False).configure_view(strokeWidth=0))
 
         with col2:
             c = (alt.Chart(resources_per_category)
@@ -631,7 +1228,7 @@ def show_dashboard(config):
                 .properties(title='Number of resources per classifier')
             )
                     
-            st.altair_chart((c.mark_bar() + c.mark_text(align='center', dy=-10)).configure_axis(grid=False).configure_view(strokeWidth=0), use_container_width=True) 
+            show_chart("resources_per_category", version, lambda: (c.mark_bar() + c.mark_text(align='center', dy=-10)).configure_axis(grid=False).configure_view(strokeWidth=0))
 
         with col3:
             st.markdown(
@@ -665,7 +1262,7 @@ def show_dashboard(config):
                 .properties(title='Number of findings per region')
             )
             
-            st.altair_chart((c.mark_bar() + c.mark_text(align='center', dy=-10)).configure_axis(grid=False).configure_view(strokeWidth=0), use_container_width=True)
+            show_chart("findings_per_region", version, lambda: (c.mark_bar() + c.mark_text(align='center', dy=-10)).configure_axis(grid=False).configure_view(strokeWidth=0))
 
         with col3:
             c = (alt.Chart(findings_per_type)
@@ -673,7 +1270,7 @@ def show_dashboard(config):
                 .properties(title='Number of findings per type')
             )
             
-            st.altair_chart((c.mark_bar() + c.mark_text(align='center', dy=-10)).configure_axis(grid=False).configure_view(strokeWidth=0), use_container_width=True)
+            show_chart("findings_per_type", version, lambda: (c.mark_bar() + c.mark_text(align='center', dy=-10)).configure_axis(grid=False).configure_view(strokeWidth=0))
 
         st.write("#")
 
@@ -686,7 +1283,7 @@ def show_dashboard(config):
                 .properties(title='Number of findings per classifier')
             )
                     
-            st.altair_chart((c.mark_bar() + c.mark_text(align='center', dy=-10)).configure_axis(grid=False).configure_view(strokeWidth=0), use_container_width=True) 
+            show_chart("findings_per_classifier", version, lambda: (c.mark_bar() + c.mark_text(align='center', dy=-10)).configure_axis(grid=False).configure_view(strokeWidth=0))
 
         with col2:
             st.markdown(
@@ -715,7 +1312,7 @@ def show_dashboard(config):
                 .properties(title='Number of findings per resource type and classifier')
             )
 
-            st.altair_chart(c.mark_rect(), use_container_width=True) 
+            show_chart("findings_per_type_and_classifier", version, lambda: c.mark_rect())
 
         #group 2.4
         col1, col2 = st.columns([1,2])
@@ -726,7 +1323,7 @@ def show_dashboard(config):
                 .properties(title='Number of findings per resource type and severity')
             )
 
-            col1.altair_chart((c.mark_rect() + c.mark_text(baseline="middle", fontWeight="bold").encode(color=alt.value("white"))), use_container_width=True) 
+            show_chart("findings_per_type_and_severity", version, lambda: (c.mark_rect() + c.mark_text(baseline="middle", fontWeight="bold").encode(color=alt.value("white"))))
 
         with col2:
             st.markdown(
@@ -758,7 +1355,7 @@ def show_dashboard(config):
                 .properties(title='Number of total matches per region')
             )
             
-            st.altair_chart((c.mark_bar() + c.mark_text(align='center', dy=-10)).configure_axis(grid=False).configure_view(strokeWidth=0), use_container_width=True)
+            show_chart("total_matches_per_region", version, lambda: (c.mark_bar() + c.mark_text(align='center', dy=-10)).configure_axis(grid=False).configure_view(strokeWidth=0))
 
         with col3:
             c = (alt.Chart(total_matches_per_type)
@@ -766,7 +1363,7 @@ def show_dashboard(config):
                 .properties(title='Number of total matches per type')
             )
             
-            st.altair_chart((c.mark_bar() + c.mark_text(align='center', dy=-10)).configure_axis(grid=False).configure_view(strokeWidth=0), use_container_width=True)
+            show_chart("total_matches_per_type", version, lambda: (c.mark_bar() + c.mark_text(align='center', dy=-10)).configure_axis(grid=False).configure_view(strokeWidth=0))
 
         st.write("#")
 
@@ -779,7 +1376,7 @@ def show_dashboard(config):
                 .properties(title='Number of total matches per classifier')
             )
                     
-            st.altair_chart((c.mark_bar() + c.mark_text(align='center', dy=-10)).configure_axis(grid=False).configure_view(strokeWidth=0), use_container_width=True) 
+            show_chart("total_matches_per_classifier", version, lambda: (c.mark_bar() + c.mark_text(align='center', dy=-10)).configure_axis(grid=False).configure_view(strokeWidth=0))
 
         with col2:
             st.markdown(
@@ -807,7 +1404,7 @@ def show_dashboard(config):
                 .properties(title='Number of total matches per resource type and classifier')
             )
 
-            st.altair_chart(c.mark_rect(), use_container_width=True) 
+            show_chart("total_matches_per_type_and_classifier", version, lambda: c.mark_rect())
 
         #group 3.4
         col1, col2 = st.columns([1,2])
@@ -820,7 +1417,7 @@ def show_dashboard(config):
                .properties(title='Number of total matches per resource type and severity')
             )
 
-            st.altair_chart((c.mark_rect() + c.mark_text(baseline="middle", fontWeight="bold").encode(color=alt.value("white"))), use_container_width=True) 
+            show_chart("total_matches_per_type_and_severity", version, lambda: (c.mark_rect() + c.mark_text(baseline="middle", fontWeight="bold").encode(color=alt.value("white"))))
 
         with col2:
             st.markdown(
@@ -840,21 +1437,19 @@ def show_dashboard(config):
             """
         )
         
-        columns=['name', 'type', 'Classifier','Unique Matches','Total Matches','Severity']
-        
-        st.dataframe(data_scan_resources_ready_df[columns].pivot_table(values=["Unique Matches","Total Matches"], index=["name","type","Severity"], columns="Classifier", aggfunc="sum"))
+        st.dataframe(get_dashboard_pivot(version, config.get('dashboard_aggregations_pushdown', False), data_scan_resources_ready_df))
 
         st.write("")
 
         #group 6
         with st.expander("Finding Examples"):
-            st.dataframe(data_scan_resources_exploded_df,hide_index=True,column_config={"id":"Resource Id","name":"Resource Name","type":"Resource Type","_subscriptionExternalId":"Resource Account","Category": "Finding Category","Classifier": "Finding Classifier","key": "Key","path":"Path"})
+            st.dataframe(get_dashboard_examples(data_scan_resources_exploded_df.attrs.get('version') or version, data_scan_resources_exploded_df),hide_index=True,column_config={"id":"Resource Id","name":"Resource Name","type":"Resource Type","_subscriptionExternalId":"Resource Account","Category": "Finding Category","Classifier": "Finding Classifier","key": "Key","path":"Path"})
             
         st.write("#")
 
 
         #do all findings
-        do_all_findings(config, data_scan_resources_ready_df, data_scan_resources_exploded_df)
+        do_all_findings(config, data_scan_resources_ready_df, get_dashboard_examples(data_scan_resources_exploded_df.attrs.get('version') or version, data_scan_resources_exploded_df))
 
         st.markdown("[Results](https://print.collibra.com/profile/9693d5ce-9fb4-4e97-b46e-7218526eda14/activities)")
         
@@ -930,340 +1525,7 @@ def show_progress(runId):
     time.sleep(1)
 
 
-def do_finding(importService, config, entries, x):
-    # data category
-    if x['Category'] not in entries[0]:
-        entries[0][x['Category']] = {
-            "entry": importService.get_asset("Privacy and Risk community", "Data categories", "Data Category", x['Category'], x['Category'])
-        }
-
-    # data concept
-    if x['Classifier'] not in entries[1]:
-        entries[1][x['Classifier']] = {
-            "entry": importService.get_asset("Data Architects community", "Business Data Models", "Data Concept", x['Classifier'], x['Classifier']),
-            "relations": [],
-            "attributes": []
-        }
-
-    if x['Category'] not in entries[1][x['Classifier']]['relations']:
-        entries[1][x['Classifier']]['relations'].append(x['Category'])
-        importService.add_relations(entries[1][x['Classifier']]['entry'], "c0e00000-0000-0000-0000-000000007316", "SOURCE", "Data categories", "Privacy and Risk community", x['Category'])
-
-    if x['Severity'] not in entries[1][x['Classifier']]['attributes']:
-        entries[1][x['Classifier']]['attributes'].append(x['Severity'])
-        importService.add_attributes(entries[1][x['Classifier']]['entry'], 'Severity', x['Severity'], 'string')
-
-    # domain
-    if x['_subscriptionExternalId'] not in entries[2]:
-        entries[2][x['_subscriptionExternalId']] = {
-            "entry": importService.get_domain(config['community_to_query'], "Technology Asset Domain", x['_subscriptionExternalId']),
-        }
-
-    # system
-    if x['_subscriptionExternalId'] not in entries[3]:
-        entries[3][x['_subscriptionExternalId']] = {
-            "entry": importService.get_asset(config['community_to_query'], x['_subscriptionExternalId'], "System", x['_subscriptionExternalId'], x['_subscriptionExternalId']),
-            "attributes": []
-        }
-
-    if x['_cloudPlatform'] not in entries[3][x['_subscriptionExternalId']]['attributes']:
-        entries[3][x['_subscriptionExternalId']]['attributes'].append(x['_cloudPlatform'])
-        importService.add_attributes(entries[3][x['_subscriptionExternalId']]['entry'], 'Platform', x['_cloudPlatform'], 'string')
-
-    if x['_subscriptionExternalId'] not in entries[3][x['_subscriptionExternalId']]['attributes']:
-        entries[3][x['_subscriptionExternalId']]['attributes'].append(x['_subscriptionExternalId'])
-        importService.add_attributes(entries[3][x['_subscriptionExternalId']]['entry'], 'Account Name', x['_subscriptionExternalId'], 'string')
-
-
-    # if buckets
-    if x['type'] == 'BUCKET':        
-        # storage container
-        if x['_externalId'] not in entries[6]:
-            entries[6][x['_externalId']] = {
-                "entry": importService.get_asset(config['community_to_query'], x['_subscriptionExternalId'], "S3 Bucket", f"s3://{x['_externalId']}/", f"s3://{x['_externalId']}/"),
-                "relations": [],
-                "attributes": []
-            }
-
-        if x['_externalId'] not in entries[6][x['_externalId']]['relations']:
-            entries[6][x['_externalId']]['relations'].append(x['_externalId'])
-            importService.add_relations(entries[6][x['_externalId']]['entry'], "00000000-0000-0000-0000-000000007054", "SOURCE", x['_subscriptionExternalId'], config['community_to_query'], x['_subscriptionExternalId'])
-
-        if x['Category'] not in entries[6][x['_externalId']]['relations']:
-            entries[6][x['_externalId']]['relations'].append(x['Category'])
-            importService.add_relations(entries[6][x['_externalId']]['entry'], "01930192-86fb-77b0-8baf-30a80dccb864", "TARGET", "Data categories", "Privacy and Risk community", x['Category'])
-
-        if x['Classifier'] not in entries[6][x['_externalId']]['relations']:
-            entries[6][x['_externalId']]['relations'].append(x['Classifier'])
-            importService.add_relations(entries[6][x['_externalId']]['entry'], "01930192-f332-70fc-8572-9f7283c4cfd4", "TARGET",  "Business Data Models", "Data Architects community", x['Classifier'])
-
-        if x['_cloudPlatform'] not in entries[6][x['_externalId']]['attributes']:
-            entries[6][x['_externalId']]['attributes'].append(x['_cloudPlatform'])
-            importService.add_attributes(entries[6][x['_externalId']]['entry'], 'Platform', x['_cloudPlatform'], 'string')
-
-        if x['_subscriptionExternalId'] not in entries[6][x['_externalId']]['attributes']:
-            entries[6][x['_externalId']]['attributes'].append(x['_subscriptionExternalId'])
-            importService.add_attributes(entries[6][x['_externalId']]['entry'], 'Account Name', x['_subscriptionExternalId'], 'string')
-
-        if x['_region'] not in entries[6][x['_externalId']]['attributes']:
-            entries[6][x['_externalId']]['attributes'].append(x['_region'])
-            importService.add_attributes(entries[6][x['_externalId']]['entry'], 'Region', x['_region'], 'string')
-
-        if x['_creationDate'] not in entries[6][x['_externalId']]['attributes']:
-            entries[6][x['_externalId']]['attributes'].append(x['_creationDate'])
-            importService.add_attributes(entries[6][x['_externalId']]['entry'], 'Created At', x['_creationDate'], 'string')
-            
-        # measure
-        entries[8][f"{x['_externalId']}:{x['Classifier']}:Unique Matches"] = {
-            "entry": importService.get_asset("Governance council", "New Data Findings Metrics", "Measure", f"{x['_externalId']}:{x['Classifier']}:Unique Matches", f"{x['Classifier']} Unique Matches")
-        }
-
-        importService.add_attributes(entries[8][f"{x['_externalId']}:{x['Classifier']}:Unique Matches"]['entry'], 'Count', x['Unique Matches'], 'string')
-
-        importService.add_relations(entries[8][f"{x['_externalId']}:{x['Classifier']}:Unique Matches"]['entry'], "01930b23-1a84-7d44-b817-275206442bf6", "TARGET",  "Business Data Models", "Data Architects community",  x['Classifier'])
-        
-        importService.add_relations(entries[8][f"{x['_externalId']}:{x['Classifier']}:Unique Matches"]['entry'], "01930b24-2617-722b-9502-8c30d4b3818c", "SOURCE",  x['_subscriptionExternalId'], config['community_to_query'], f"s3://{x['_externalId']}/")
-
-        entries[8][f"{x['_externalId']}:{x['Classifier']}:Total Matches"] = {
-            "entry": importService.get_asset("Governance council", "New Data Findings Metrics", "Measure", f"{x['_externalId']}:{x['Classifier']}:Total Matches", f"{x['Classifier']} Total Matches")
-        }
-
-        importService.add_attributes(entries[8][f"{x['_externalId']}:{x['Classifier']}:Total Matches"]['entry'], 'Count', x['Total Matches'], 'string')
-
-        importService.add_relations(entries[8][f"{x['_externalId']}:{x['Classifier']}:Total Matches"]['entry'], "01930b23-1a84-7d44-b817-275206442bf6", "TARGET",  "Business Data Models", "Data Architects community",  x['Classifier'])
-        
-        importService.add_relations(entries[8][f"{x['_externalId']}:{x['Classifier']}:Total Matches"]['entry'], "01930b24-2617-722b-9502-8c30d4b3818c", "SOURCE",  x['_subscriptionExternalId'], config['community_to_query'], f"s3://{x['_externalId']}/")
-
-        # dimension
-        if x['Classifier'] not in entries[9]:
-            entries[9][x['Classifier']] = {
-                "entry": importService.get_asset("Governance council", "Data Findings Dimensions", "Data Findings Dimension", x['Classifier'], x['Classifier'])
-            }
-
-        # metric    
-        entries[10][f"s3://{x['_externalId']}/:{x['Classifier']}:Unique Matches:Rule"] = {
-            "entry": importService.get_asset("Governance council", "Data Findings Rules", "Data Findings Rule",f"s3://{x['_externalId']}/:{x['Classifier']}:Unique Matches", f"{x['Classifier']} Unique Matches")
-        }
-
-        importService.add_relations(entries[10][f"s3://{x['_externalId']}/:{x['Classifier']}:Unique Matches:Rule"]['entry'], "00000000-0000-0000-0000-000000007018", "SOURCE",  x['_subscriptionExternalId'], config['community_to_query'], f"s3://{x['_externalId']}/")
-        
-
-        entries[10][f"s3://{x['_externalId']}/:{x['Classifier']}:Total Matches:Rule"] = {
-            "entry": importService.get_asset("Governance council", "Data Findings Rules", "Data Findings Rule", f"s3://{x['_externalId']}/:{x['Classifier']}:Total Matches", f"{x['Classifier']} Total Matches")
-        }
-
-        importService.add_relations(entries[10][f"s3://{x['_externalId']}/:{x['Classifier']}:Total Matches:Rule"]['entry'], "00000000-0000-0000-0000-000000007018", "SOURCE",  x['_subscriptionExternalId'], config['community_to_query'], f"s3://{x['_externalId']}/")
-
-        entries[10][f"s3://{x['_externalId']}/:{x['Classifier']}:Unique Matches:Metric"] = {
-            "entry": importService.get_asset("Governance council", "Data Findings Metrics", "Data Findings Metric", f"s3://{x['_externalId']}/:{x['Classifier']}:Unique Matches", f"{x['Classifier']} Unique Matches")
-        }
-
-        importService.add_attributes(entries[10][f"s3://{x['_externalId']}/:{x['Classifier']}:Unique Matches:Metric"]['entry'], 'Passing Fraction', x['Unique Matches'], 'string')
-
-        importService.add_relations(entries[10][f"s3://{x['_externalId']}/:{x['Classifier']}:Unique Matches:Metric"]['entry'], "01931f87-3dca-7b65-a03c-dce0146ade76", "TARGET",  "Data Findings Dimensions", "Governance council", x['Classifier'])
-        
-        importService.add_relations(entries[10][f"s3://{x['_externalId']}/:{x['Classifier']}:Unique Matches:Metric"]['entry'], "01931feb-4b9a-7b6b-a456-e1a2759ceca4", "SOURCE",  "Data Findings Rules", "Governance council", f"s3://{x['_externalId']}/:{x['Classifier']}:Unique Matches")
-        
-        entries[10][f"s3://{x['_externalId']}/:{x['Classifier']}:Total Matches:Metric"] = {
-            "entry": importService.get_asset("Governance council", "Data Findings Metrics", "Data Findings Metric", f"s3://{x['_externalId']}/:{x['Classifier']}:Total Matches", f"{x['Classifier']} Total Matches")
-        }
-
-        importService.add_attributes(entries[10][f"s3://{x['_externalId']}/:{x['Classifier']}:Total Matches:Metric"]['entry'], 'Passing Fraction', x['Total Matches'], 'string')
-
-        importService.add_relations(entries[10][f"s3://{x['_externalId']}/:{x['Classifier']}:Total Matches:Metric"]['entry'], "01931f87-3dca-7b65-a03c-dce0146ade76", "TARGET",  "Data Findings Dimensions", "Governance council", x['Classifier'])
-
-        importService.add_relations(entries[10][f"s3://{x['_externalId']}/:{x['Classifier']}:Total Matches:Metric"]['entry'], "01931feb-4b9a-7b6b-a456-e1a2759ceca4", "SOURCE",  "Data Findings Rules", "Governance council", f"s3://{x['_externalId']}/:{x['Classifier']}:Total Matches")
-
-
-    # if database
-    if x['type'] in ('DATABASE', 'DB_SERVER'):
-        if x['_externalId'] not in entries[7]:
-            entries[7][x['_externalId']] = {
-                "entry": importService.get_asset(config['community_to_query'], x['_subscriptionExternalId'], "System", x['name'], x['name']), #Database
-                "relations": [],
-                "attributes": []
-            }
-
-        if x['_subscriptionExternalId'] not in entries[7][x['_externalId']]['relations']:
-            entries[7][x['_externalId']]['relations'].append(x['_subscriptionExternalId'])
-            importService.add_relations(entries[7][x['_externalId']]['entry'], "00000000-0000-0000-0000-000000007054", "SOURCE",  x['_subscriptionExternalId'], config['community_to_query'], x['_subscriptionExternalId'])
-
-        if x['Category'] not in entries[7][x['_externalId']]['relations']:
-            entries[7][x['_externalId']]['relations'].append(x['Category'])
-            importService.add_relations(entries[7][x['_externalId']]['entry'], "019465e7-438a-7115-8158-68545ff8d12d", "TARGET", "Data categories", "Privacy and Risk community", x['Category']) #01944282-004e-73ea-a9d6-5a418e9738a7
-
-        if x['Classifier'] not in entries[7][x['_externalId']]['relations']:
-            entries[7][x['_externalId']]['relations'].append(x['Classifier'])
-            importService.add_relations(entries[7][x['_externalId']]['entry'], "019465e8-5d94-76a6-a34b-68a3f8d7c74c", "TARGET",  "Business Data Models", "Data Architects community", x['Classifier']) #01944282-9d1a-7185-97a6-3b2aef01c556
-
-        if x['_cloudPlatform'] not in entries[7][x['_externalId']]['attributes']:
-            entries[7][x['_externalId']]['attributes'].append(x['_cloudPlatform'])
-            importService.add_attributes(entries[7][x['_externalId']]['entry'], 'Platform', x['_cloudPlatform'], 'string')
-
-        if x['_subscriptionExternalId'] not in entries[7][x['_externalId']]['attributes']:
-            entries[7][x['_externalId']]['attributes'].append(x['_subscriptionExternalId'])
-            importService.add_attributes(entries[7][x['_externalId']]['entry'], 'Account Name', x['_subscriptionExternalId'], 'string')
-
-        if x['_region'] not in entries[7][x['_externalId']]['attributes']:
-            entries[7][x['_externalId']]['attributes'].append(x['_region'])
-            importService.add_attributes(entries[7][x['_externalId']]['entry'], 'Region', x['_region'], 'string')
-
-        if x['_creationDate'] not in entries[7][x['_externalId']]['attributes']:
-            entries[7][x['_externalId']]['attributes'].append(x['_creationDate'])
-            importService.add_attributes(entries[7][x['_externalId']]['entry'], 'Created At', x['_creationDate'], 'string')
-
-        if x['_externalId'] not in entries[7][x['_externalId']]['attributes']:
-            entries[7][x['_externalId']]['attributes'].append(x['_externalId'])
-            importService.add_attributes(entries[7][x['_externalId']]['entry'], 'Principal Identifier', x['_externalId'], 'string')
-
-        # measure
-        entries[8][f"{x['name']}:{x['Classifier']}:Unique Matches"] = {
-            "entry": importService.get_asset("Governance council", "New Data Findings Metrics", "Measure", f"{x['name']}:{x['Classifier']}:Unique Matches", f"{x['Classifier']} Unique Matches")
-        }
-
-        importService.add_attributes(entries[8][f"{x['name']}:{x['Classifier']}:Unique Matches"]['entry'], 'Count', x['Unique Matches'], 'string')
-
-        importService.add_relations(entries[8][f"{x['name']}:{x['Classifier']}:Unique Matches"]['entry'], "01930b23-1a84-7d44-b817-275206442bf6", "TARGET",  "Business Data Models", "Data Architects community",  x['Classifier'])
-        
-        importService.add_relations(entries[8][f"{x['name']}:{x['Classifier']}:Unique Matches"]['entry'], "019465e9-0c5a-7293-863b-adad740124cc", "SOURCE",  x['_subscriptionExternalId'], config['community_to_query'], x['name']) #01944259-fa74-7122-902a-f019e671cc3a
-
-        entries[8][f"{x['name']}:{x['Classifier']}:Total Matches"] = {
-            "entry": importService.get_asset("Governance council", "New Data Findings Metrics", "Measure", f"{x['name']}:{x['Classifier']}:Total Matches", f"{x['Classifier']} Total Matches")
-        }
-
-        importService.add_attributes(entries[8][f"{x['name']}:{x['Classifier']}:Total Matches"]['entry'], 'Count', x['Total Matches'], 'string')
-
-        importService.add_relations(entries[8][f"{x['name']}:{x['Classifier']}:Total Matches"]['entry'], "01930b23-1a84-7d44-b817-275206442bf6", "TARGET",  "Business Data Models", "Data Architects community",  x['Classifier'])
-        
-        importService.add_relations(entries[8][f"{x['name']}:{x['Classifier']}:Total Matches"]['entry'], "019465e9-0c5a-7293-863b-adad740124cc", "SOURCE",  x['_subscriptionExternalId'], config['community_to_query'], x['name']) #01944259-fa74-7122-902a-f019e671cc3a
-
-        # dimension
-        if x['Classifier'] not in entries[9]:
-            entries[9][x['Classifier']] = {
-                "entry": importService.get_asset("Governance council", "Data Findings Dimensions", "Data Findings Dimension", x['Classifier'], x['Classifier'])
-            }
-
-        # metric    
-        entries[10][f"{x['name']}:{x['Classifier']}:Unique Matches:Rule"] = {
-            "entry": importService.get_asset("Governance council", "Data Findings Rules", "Data Findings Rule",f"{x['name']}:{x['Classifier']}:Unique Matches", f"{x['Classifier']} Unique Matches")
-        }
-
-        importService.add_relations(entries[10][f"{x['name']}:{x['Classifier']}:Unique Matches:Rule"]['entry'], "00000000-0000-0000-0000-000000007018", "SOURCE",  x['_subscriptionExternalId'], config['community_to_query'], f"{x['name']}")
-        
-
-        entries[10][f"{x['name']}:{x['Classifier']}:Total Matches:Rule"] = {
-            "entry": importService.get_asset("Governance council", "Data Findings Rules", "Data Findings Rule", f"{x['name']}:{x['Classifier']}:Total Matches", f"{x['Classifier']} Total Matches")
-        }
-
-        importService.add_relations(entries[10][f"{x['name']}:{x['Classifier']}:Total Matches:Rule"]['entry'], "00000000-0000-0000-0000-000000007018", "SOURCE",  x['_subscriptionExternalId'], config['community_to_query'], f"{x['name']}")
-
-        entries[10][f"{x['name']}:{x['Classifier']}:Unique Matches:Metric"] = {
-            "entry": importService.get_asset("Governance council", "Data Findings Metrics", "Data Findings Metric", f"{x['name']}:{x['Classifier']}:Unique Matches", f"{x['Classifier']} Unique Matches")
-        }
-
-        importService.add_attributes(entries[10][f"{x['name']}:{x['Classifier']}:Unique Matches:Metric"]['entry'], 'Passing Fraction', x['Unique Matches'], 'string')
-
-        importService.add_relations(entries[10][f"{x['name']}:{x['Classifier']}:Unique Matches:Metric"]['entry'], "01931f87-3dca-7b65-a03c-dce0146ade76", "TARGET",  "Data Findings Dimensions", "Governance council", x['Classifier'])
-        
-        importService.add_relations(entries[10][f"{x['name']}:{x['Classifier']}:Unique Matches:Metric"]['entry'], "01931feb-4b9a-7b6b-a456-e1a2759ceca4", "SOURCE",  "Data Findings Rules", "Governance council", f"{x['name']}:{x['Classifier']}:Unique Matches")
-        
-        entries[10][f"{x['name']}:{x['Classifier']}:Total Matches:Metric"] = {
-            "entry": importService.get_asset("Governance council", "Data Findings Metrics", "Data Findings Metric", f"{x['name']}:{x['Classifier']}:Total Matches", f"{x['Classifier']} Total Matches")
-        }
-
-        importService.add_attributes(entries[10][f"{x['name']}:{x['Classifier']}:Total Matches:Metric"]['entry'], 'Passing Fraction', x['Total Matches'], 'string')
-
-        importService.add_relations(entries[10][f"{x['name']}:{x['Classifier']}:Total Matches:Metric"]['entry'], "01931f87-3dca-7b65-a03c-dce0146ade76", "TARGET",  "Data Findings Dimensions", "Governance council", x['Classifier'])
-
-        importService.add_relations(entries[10][f"{x['name']}:{x['Classifier']}:Total Matches:Metric"]['entry'], "01931feb-4b9a-7b6b-a456-e1a2759ceca4", "SOURCE",  "Data Findings Rules", "Governance council", f"{x['name']}:{x['Classifier']}:Total Matches")
-
-
-def do_finding_example(importService, config, entries, x):
-    # if bucket
-    if x['type'] == 'BUCKET':        
-        file = f"s3://{x['name']}/{x['path']}"
-
-        entries[11][file] = {
-            "entry": importService.get_asset(config['community_to_query'], x['_subscriptionExternalId'], "File", file, x['path']),
-            "relations": []
-        }
-
-        importService.add_relations(entries[11][file]['entry'], "00000000-0000-0000-0000-000000007060", "SOURCE", x['_subscriptionExternalId'], config['community_to_query'], f"s3://{x['name']}/")
-
-        # importService.add_relations(entries[11][file]['entry'], "01943678-0ab4-7015-ba1f-0f9a168a6ade", "TARGET", "Data categories", "Privacy and Risk community", x['Category'])
-
-        # importService.add_relations(entries[11][file]['entry'], "01943678-ebf1-7cd5-bc9c-c78b2d115f3c", "TARGET",  "Business Data Models", "Data Architects community", x['Classifier'])
-
-
-    # if database
-    if x['type'] in ('DATABASE', 'DB_SERVER'):
-        parts = x['path'].split('.')[::-1] 
-
-        parts = (parts + [parts[-1], parts[-1]])[:3]
-
-        #database
-        database = parts.pop()
-        if f"{x['name']}>{database}" not in entries[12]:
-            entries[12][f"{x['name']}>{database}"] = {
-                "entry": importService.get_asset(config['community_to_query'], x['_subscriptionExternalId'], "Database", f"{x['name']}>{database}", database),
-                "relations": []
-            }
-
-        if x['name'] not in entries[12][f"{x['name']}>{database}"]['relations']:
-            entries[12][f"{x['name']}>{database}"]['relations'].append(x['name'])
-            importService.add_relations(entries[12][f"{x['name']}>{database}"]['entry'], "00000000-0000-0000-0000-000000007054", "SOURCE", x['_subscriptionExternalId'], config['community_to_query'], x['name'])
-
-        # if x['name'] not in entries[12][f"{x['name']}>{database}"]['relations']:
-        #     entries[12][f"{x['name']}>{database}"]['relations'].append(x['name'])
-        #     importService.add_relations(entries[12][f"{x['name']}>{database}"]['entry'], "00000000-0000-0000-0000-000000007054", "SOURCE", x['_subscriptionExternalId'], config['community_to_query'], x['name'])
-
-        # if x['_cloudPlatform'] not in entries[12][f"{x['name']}>{database}"]['attributes']:
-        #     entries[12][f"{x['name']}>{database}"]['attributes'].append(x['_cloudPlatform'])
-        #     importService.add_attributes(entries[12][f"{x['name']}>{database}"]['entry'], 'Platform', x['_cloudPlatform'], 'string')
-
-        # if x['_subscriptionExternalId'] not in entries[12][f"{x['name']}>{database}"]['attributes']:
-        #     entries[12][f"{x['name']}>{database}"]['attributes'].append(x['_subscriptionExternalId'])
-        #     importService.add_attributes(entries[12][f"{x['name']}>{database}"]['entry'], 'Account Name', x['_subscriptionExternalId'], 'string')
-
-        # if x['_region'] not in entries[12][f"{x['name']}>{database}"]['attributes']:
-        #     entries[12][f"{x['name']}>{database}"]['attributes'].append(x['_region'])
-        #     importService.add_attributes(entries[12][f"{x['name']}>{database}"]['entry'], 'Region', x['_region'], 'string')
-
-        # if x['_creationDate'] not in entries[12][f"{x['name']}>{database}"]['attributes']:
-        #     entries[12][f"{x['name']}>{database}"]['attributes'].append(x['_creationDate'])
-        #     importService.add_attributes(entries[12][f"{x['name']}>{database}"]['entry'], 'Created At', x['_creationDate'], 'string')
-
-        # if x['_externalId'] not in entries[12][f"{x['name']}>{database}"]['attributes']:
-        #     entries[12][f"{x['name']}>{database}"]['attributes'].append(x['_externalId'])
-        #     importService.add_attributes(entries[12][f"{x['name']}>{database}"]['entry'], 'Principal Identifier', x['_externalId'], 'string')
-
-        # schema
-        schema = parts.pop()
-        if f"{x['name']}>{database}>{schema}" not in entries[13]:
-            entries[13][f"{x['name']}>{database}>{schema}"] = {
-                "entry": importService.get_asset(config['community_to_query'], x['_subscriptionExternalId'], "Schema", f"{x['name']}>{database}>{schema}", schema),
-                "relations": [],
-                "attributes": []
-            }
-
-        if  f"{x['name']}>{database}" not in entries[13][f"{x['name']}>{database}>{schema}"]['relations']:
-            entries[13][f"{x['name']}>{database}>{schema}"]['relations'].append(f"{x['name']}>{database}")
-            importService.add_relations(entries[13][f"{x['name']}>{database}>{schema}"]['entry'], "00000000-0000-0000-0000-000000007024", "SOURCE", x['_subscriptionExternalId'], config['community_to_query'], f"{x['name']}>{database}")
-
-        # table
-        table = parts.pop()
-        if f"{x['name']}>{database}>{schema}>{table}" not in entries[14]:
-            entries[14][f"{x['name']}>{database}>{schema}>{table}"] = {
-                "entry": importService.get_asset(config['community_to_query'], x['_subscriptionExternalId'], "Table", f"{x['name']}>{database}>{schema}>{table}", table),
-                "relations": [],
-                "attributes": []
-            }
-
-        if  f"{x['name']}>{database}>{schema}" not in entries[14][f"{x['name']}>{database}>{schema}>{table}"]['relations']:
-            entries[14][f"{x['name']}>{database}>{schema}>{table}"]['relations'].append(f"{x['name']}>{database}>{schema}")
-            importService.add_relations(entries[14][f"{x['name']}>{database}>{schema}>{table}"]['entry'], "00000000-0000-0000-0000-000000007043", "SOURCE", x['_subscriptionExternalId'], config['community_to_query'], f"{x['name']}>{database}>{schema}")
-
-    
+#do all findings
 def do_all_findings(config, data_scan_resources_ready_df, data_scan_resources_exploded_df):
     logging.getLogger().debug("do all findings")
 
@@ -1309,23 +1571,24 @@ def do_all_findings(config, data_scan_resources_ready_df, data_scan_resources_ex
 
     config['community_to_query'] = community # (communities.get(community) if community else st.warning("Please specify.") & st.stop())
 
-    importService = ImportService(runId, 1, 150000)
-
-    entries = [{} for element in range(15)]
+    importService = ImportService(runId, 1, 150000, custom_asset_import_maximum_bytes=config.get('import_maximum_bytes'), compression=config.get('import_compression'), writers=config.get('import_writers', 1))
 
-    data_scan_resources_ready_df.apply(lambda x: do_finding(importService, config, entries, x), axis=1)
+    do_finding_examples = 'do_finding_examples' in st.session_state and st.session_state.do_finding_examples
 
-    if 'do_finding_examples' in st.session_state and st.session_state.do_finding_examples:
-        data_scan_resources_exploded_df.apply(lambda x: do_finding_example(importService, config, entries, x), axis=1)
+    # registration needs every ready row, with the aggregations pushed down they are only loaded now
+    if data_scan_resources_ready_df is None:
+        data_scan_resources_ready_df = get_data_findings_ready(st.connection("snowflake").session())
 
+    entries = build_entries(importService, config, data_scan_resources_ready_df, data_scan_resources_exploded_df if do_finding_examples else None, config.get('findings_transform_workers', 1), True)
 
-    # each in it step file
-    allEntries = [[] for element in range(15)]
 
-    _= [allEntries[i].append(v['entry']) for i,e in enumerate(entries) for k,v in e.items()]
+    # each in it step file, streamed categories are built while their parts are written
+    allEntries = [e if isinstance(e, EntryStream) else [v['entry'] for k,v in e.items()] for e in entries]
 
     _= [importService.save(e, "./runs", runId, i, True) for i,e in enumerate(allEntries)]
 
+    importService.commit("./runs")
+
     
     HarvesterService().run(config, "./runs") 
 
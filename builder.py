@@ -0,0 +1,416 @@
+import logging
+
+import pandas as pd
+
+from functools import partial
+from itertools import repeat
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+
+#database types
+DATABASE_TYPES = ['DATABASE', 'DB_SERVER']
+
+#streamed categories, measures, rules and metrics, files and tables
+STREAMED_CATEGORIES = [8, 10, 11, 14]
+
+
+#get columns, plain python lists so entries are built from native values, missing values of nullable,
+#arrow backed and categorical columns (pd.NA, NaN) become None and are written as null
+def get_columns(df, columns):
+    return {c: df[c].astype(object).where(df[c].notna(), None).tolist() for c in columns}
+
+
+#get firsts, position of the first row of every key, in row order
+def get_firsts(keys):
+    keys = pd.Series(keys, dtype=object)
+
+    return keys.index[~keys.duplicated()].tolist()
+
+
+#get lasts, (first, last) positions of every key, in the order of its first row, as a dict assignment per row would leave them
+def get_lasts(keys):
+    keys = pd.Series(keys, dtype=object)
+
+    firsts = keys[~keys.duplicated()]
+
+    lasts = keys[~keys.duplicated(keep='last')]
+
+    return list(zip(firsts.index.tolist(), pd.Series(lasts.index, index=lasts.values).reindex(firsts.values).tolist()))
+
+
+#get events, (key, slot, row) of every candidate the row-wise builder would have added, deduplicated on the value it checked per key
+def get_events(keys, values):
+    events = pd.DataFrame({
+        'key': [k for _ in values for k in keys],
+        'slot': [j for j, v in enumerate(values) for _ in v],
+        'pos': [i for v in values for i in range(len(v))],
+        'value': [x for v in values for x in v]
+    }, dtype=object)
+
+    events = events.sort_values(by=['pos', 'slot'], kind='stable').drop_duplicates(subset=['key', 'value'])
+
+    return zip(events['key'].tolist(), events['slot'].tolist(), events['pos'].tolist())
+
+
+#interleave, flattens per row slots in (row, slot) order
+def interleave(*slots):
+    return [x for row in zip(*slots) for x in row]
+
+
+#entry stream, entries of a streamed category built again as they are iterated, so they are written without being held
+@dataclass
+class EntryStream:
+    size: int = 0
+    build: Optional[Callable] = None
+
+    def __len__(self):
+        return self.size
+
+    def __iter__(self):
+        return (v['entry'] for k, v in self.build())
+
+    def __str__(self):
+        return f"EntryStream [size={self.size}]"
+
+
+#set entries, keyed in memory, or streamed for the high volume categories that need no dedup once built
+def set_entries(entries, n, size, build, stream):
+    entries[n] = EntryStream(size, build) if stream and n in STREAMED_CATEGORIES else dict(build())
+
+
+#build data categories
+def build_data_categories(importService, config, ready_df, entries):
+    c, rows = get_columns(ready_df, ['Category']), ready_df.index.tolist()
+
+    for i in get_firsts(c['Category']):
+        entries[0][c['Category'][i]] = {
+            "entry": importService.get_asset("Privacy and Risk community", "Data categories", "Data Category", c['Category'][i], c['Category'][i]),
+            "order": (rows[i], 0)
+        }
+
+
+#build data concepts
+def build_data_concepts(importService, config, ready_df, entries):
+    c, rows = get_columns(ready_df, ['Classifier', 'Category', 'Severity']), ready_df.index.tolist()
+
+    for i in get_firsts(c['Classifier']):
+        entries[1][c['Classifier'][i]] = {
+            "entry": importService.get_asset("Data Architects community", "Business Data Models", "Data Concept", c['Classifier'][i], c['Classifier'][i]),
+            "order": (rows[i], 0)
+        }
+
+    for k, _, i in get_events(c['Classifier'], [c['Category']]):
+        importService.add_relations(entries[1][k]['entry'], "c0e00000-0000-0000-0000-000000007316", "SOURCE", "Data categories", "Privacy and Risk community", c['Category'][i])
+
+    for k, _, i in get_events(c['Classifier'], [c['Severity']]):
+        importService.add_attributes(entries[1][k]['entry'], 'Severity', c['Severity'][i], 'string')
+
+
+#build domains and systems
+def build_systems(importService, config, ready_df, entries):
+    c, rows = get_columns(ready_df, ['_subscriptionExternalId', '_cloudPlatform']), ready_df.index.tolist()
+
+    for i in get_firsts(c['_subscriptionExternalId']):
+        entries[2][c['_subscriptionExternalId'][i]] = {
+            "entry": importService.get_domain(config['community_to_query'], "Technology Asset Domain", c['_subscriptionExternalId'][i]),
+            "order": (rows[i], 0)
+        }
+
+        entries[3][c['_subscriptionExternalId'][i]] = {
+            "entry": importService.get_asset(config['community_to_query'], c['_subscriptionExternalId'][i], "System", c['_subscriptionExternalId'][i], c['_subscriptionExternalId'][i]),
+            "order": (rows[i], 0)
+        }
+
+    attributes = [('Platform', '_cloudPlatform'), ('Account Name', '_subscriptionExternalId')]
+
+    for k, j, i in get_events(c['_subscriptionExternalId'], [c[a[1]] for a in attributes]):
+        importService.add_attributes(entries[3][k]['entry'], attributes[j][0], c[attributes[j][1]][i], 'string')
+
+
+#build buckets
+def build_buckets(importService, config, ready_df, entries):
+    df = ready_df[ready_df['type'] == 'BUCKET']
+
+    c, rows = get_columns(df, ['_externalId', '_subscriptionExternalId', 'Category', 'Classifier', '_cloudPlatform', '_region', '_creationDate']), df.index.tolist()
+
+    for i in get_firsts(c['_externalId']):
+        entries[6][c['_externalId'][i]] = {
+            "entry": importService.get_asset(config['community_to_query'], c['_subscriptionExternalId'][i], "S3 Bucket", f"s3://{c['_externalId'][i]}/", f"s3://{c['_externalId'][i]}/"),
+            "order": (rows[i], 0)
+        }
+
+    relations = [
+        lambda e, i: importService.add_relations(e, "00000000-0000-0000-0000-000000007054", "SOURCE", c['_subscriptionExternalId'][i], config['community_to_query'], c['_subscriptionExternalId'][i]),
+        lambda e, i: importService.add_relations(e, "01930192-86fb-77b0-8baf-30a80dccb864", "TARGET", "Data categories", "Privacy and Risk community", c['Category'][i]),
+        lambda e, i: importService.add_relations(e, "01930192-f332-70fc-8572-9f7283c4cfd4", "TARGET",  "Business Data Models", "Data Architects community", c['Classifier'][i])
+    ]
+
+    for k, j, i in get_events(c['_externalId'], [c['_externalId'], c['Category'], c['Classifier']]):
+        relations[j](entries[6][k]['entry'], i)
+
+    attributes = [('Platform', '_cloudPlatform'), ('Account Name', '_subscriptionExternalId'), ('Region', '_region'), ('Created At', '_creationDate')]
+
+    for k, j, i in get_events(c['_externalId'], [c[a[1]] for a in attributes]):
+        importService.add_attributes(entries[6][k]['entry'], attributes[j][0], c[attributes[j][1]][i], 'string')
+
+
+#build databases
+def build_databases(importService, config, ready_df, entries):
+    df = ready_df[ready_df['type'].isin(DATABASE_TYPES)]
+
+    c, rows = get_columns(df, ['_externalId', 'name', '_subscriptionExternalId', 'Category', 'Classifier', '_cloudPlatform', '_region', '_creationDate']), df.index.tolist()
+
+    for i in get_firsts(c['_externalId']):
+        entries[7][c['_externalId'][i]] = {
+            "entry": importService.get_asset(config['community_to_query'], c['_subscriptionExternalId'][i], "System", c['name'][i], c['name'][i]), #Database
+            "order": (rows[i], 0)
+        }
+
+    relations = [
+        lambda e, i: importService.add_relations(e, "00000000-0000-0000-0000-000000007054", "SOURCE",  c['_subscriptionExternalId'][i], config['community_to_query'], c['_subscriptionExternalId'][i]),
+        lambda e, i: importService.add_relations(e, "019465e7-438a-7115-8158-68545ff8d12d", "TARGET", "Data categories", "Privacy and Risk community", c['Category'][i]),
+        lambda e, i: importService.add_relations(e, "019465e8-5d94-76a6-a34b-68a3f8d7c74c", "TARGET",  "Business Data Models", "Data Architects community", c['Classifier'][i])
+    ]
+
+    for k, j, i in get_events(c['_externalId'], [c['_subscriptionExternalId'], c['Category'], c['Classifier']]):
+        relations[j](entries[7][k]['entry'], i)
+
+    attributes = [('Platform', '_cloudPlatform'), ('Account Name', '_subscriptionExternalId'), ('Region', '_region'), ('Created At', '_creationDate'), ('Principal Identifier', '_externalId')]
+
+    for k, j, i in get_events(c['_externalId'], [c[a[1]] for a in attributes]):
+        importService.add_attributes(entries[7][k]['entry'], attributes[j][0], c[attributes[j][1]][i], 'string')
+
+
+#build measures, dimensions, rules and metrics, buckets and databases share the same shape
+def build_measures(importService, config, ready_df, entries, stream=False):
+    df = ready_df[ready_df['type'].isin(['BUCKET'] + DATABASE_TYPES)]
+
+    c, rows = get_columns(df, ['type', '_externalId', 'name', '_subscriptionExternalId', 'Classifier', 'Unique Matches', 'Total Matches']), df.index.tolist()
+
+    bucket = [t == 'BUCKET' for t in c['type']]
+
+    # measures are keyed by the bucket external id or the database name, rules and metrics by the asset they measure
+    base = [x if b else n for b, x, n in zip(bucket, c['_externalId'], c['name'])]
+
+    asset = [f"s3://{x}/" if b else f"{n}" for b, x, n in zip(bucket, c['_externalId'], c['name'])]
+
+    source = ["01930b24-2617-722b-9502-8c30d4b3818c" if b else "019465e9-0c5a-7293-863b-adad740124cc" for b in bucket]
+
+    matches = ['Unique Matches', 'Total Matches']
+
+    # measure
+    measure_keys = interleave(*[[f"{m}:{cl}:{x}" for m, cl in zip(base, c['Classifier'])] for x in matches])
+
+    measure_lasts = get_lasts(measure_keys)
+
+    def measures():
+        for f, p in measure_lasts:
+            i, x = p // 2, matches[p % 2]
+
+            entry = importService.get_asset("Governance council", "New Data Findings Metrics", "Measure", measure_keys[p], f"{c['Classifier'][i]} {x}")
+
+            importService.add_attributes(entry, 'Count', c[x][i], 'string')
+
+            importService.add_relations(entry, "01930b23-1a84-7d44-b817-275206442bf6", "TARGET",  "Business Data Models", "Data Architects community",  c['Classifier'][i])
+
+            importService.add_relations(entry, source[i], "SOURCE",  c['_subscriptionExternalId'][i], config['community_to_query'], asset[i])
+
+            yield measure_keys[p], {"entry": entry, "order": (rows[f // 2], f % 2), "last": (rows[i], p % 2)}
+
+    set_entries(entries, 8, len(measure_lasts), measures, stream)
+
+    # dimension
+    for i in get_firsts(c['Classifier']):
+        entries[9][c['Classifier'][i]] = {
+            "entry": importService.get_asset("Governance council", "Data Findings Dimensions", "Data Findings Dimension", c['Classifier'][i], c['Classifier'][i]),
+            "order": (rows[i], 0)
+        }
+
+    # metric
+    kinds = [(x, k) for k in ['Rule', 'Metric'] for x in matches]
+
+    metric_keys = interleave(*[[f"{a}:{cl}:{x}:{k}" for a, cl in zip(asset, c['Classifier'])] for x, k in kinds])
+
+    metric_lasts = get_lasts(metric_keys)
+
+    def metrics():
+        for f, p in metric_lasts:
+            i, (x, k) = p // 4, kinds[p % 4]
+
+            name = f"{asset[i]}:{c['Classifier'][i]}:{x}"
+
+            if k == 'Rule':
+                entry = importService.get_asset("Governance council", "Data Findings Rules", "Data Findings Rule", name, f"{c['Classifier'][i]} {x}")
+
+                importService.add_relations(entry, "00000000-0000-0000-0000-000000007018", "SOURCE",  c['_subscriptionExternalId'][i], config['community_to_query'], asset[i])
+
+            else:
+                entry = importService.get_asset("Governance council", "Data Findings Metrics", "Data Findings Metric", name, f"{c['Classifier'][i]} {x}")
+
+                importService.add_attributes(entry, 'Passing Fraction', c[x][i], 'string')
+
+                importService.add_relations(entry, "01931f87-3dca-7b65-a03c-dce0146ade76", "TARGET",  "Data Findings Dimensions", "Governance council", c['Classifier'][i])
+
+                importService.add_relations(entry, "01931feb-4b9a-7b6b-a456-e1a2759ceca4", "SOURCE",  "Data Findings Rules", "Governance council", name)
+
+            yield metric_keys[p], {"entry": entry, "order": (rows[f // 4], f % 4), "last": (rows[i], p % 4)}
+
+    set_entries(entries, 10, len(metric_lasts), metrics, stream)
+
+
+#build files
+def build_files(importService, config, exploded_df, entries, stream=False):
+    df = exploded_df[exploded_df['type'] == 'BUCKET']
+
+    c, rows = get_columns(df, ['name', 'path', '_subscriptionExternalId']), df.index.tolist()
+
+    keys = [f"s3://{n}/{p}" for n, p in zip(c['name'], c['path'])]
+
+    lasts = get_lasts(keys)
+
+    def files():
+        for f, i in lasts:
+            entry = importService.get_asset(config['community_to_query'], c['_subscriptionExternalId'][i], "File", keys[i], c['path'][i])
+
+            importService.add_relations(entry, "00000000-0000-0000-0000-000000007060", "SOURCE", c['_subscriptionExternalId'][i], config['community_to_query'], f"s3://{c['name'][i]}/")
+
+            yield keys[i], {"entry": entry, "order": (rows[f], 0), "last": (rows[i], 0)}
+
+    set_entries(entries, 11, len(lasts), files, stream)
+
+
+#build tables, paths are table, schema.table or database.schema.table, missing levels repeat the outermost one
+def build_tables(importService, config, exploded_df, entries, stream=False):
+    df = exploded_df[exploded_df['type'].isin(DATABASE_TYPES)]
+
+    c, rows = get_columns(df, ['name', 'path', '_subscriptionExternalId']), df.index.tolist()
+
+    parts = [(p.split('.')[::-1] + [p.split('.')[0]] * 2)[:3] for p in c['path']]
+
+    levels = [
+        (12, "Database", "00000000-0000-0000-0000-000000007054", [f"{n}>{p[2]}" for n, p in zip(c['name'], parts)], [p[2] for p in parts], c['name']),
+    ]
+
+    levels.append((13, "Schema", "00000000-0000-0000-0000-000000007024", [f"{k}>{p[1]}" for k, p in zip(levels[0][3], parts)], [p[1] for p in parts], levels[0][3]))
+
+    levels.append((14, "Table", "00000000-0000-0000-0000-000000007043", [f"{k}>{p[0]}" for k, p in zip(levels[1][3], parts)], [p[0] for p in parts], levels[1][3]))
+
+    # the parent is part of the key, so each entry gets its one relation from its first row
+    def assets(asset_type, relation_type, keys, names, parents, firsts):
+        for i in firsts:
+            entry = importService.get_asset(config['community_to_query'], c['_subscriptionExternalId'][i], asset_type, keys[i], names[i])
+
+            importService.add_relations(entry, relation_type, "SOURCE", c['_subscriptionExternalId'][i], config['community_to_query'], parents[i])
+
+            yield keys[i], {"entry": entry, "order": (rows[i], 0)}
+
+    for n, asset_type, relation_type, keys, names, parents in levels:
+        firsts = get_firsts(keys)
+
+        set_entries(entries, n, len(firsts), partial(assets, asset_type, relation_type, keys, names, parents, firsts), stream)
+
+
+#build shard, every category but the data concepts, whose relations and attributes gather rows across accounts
+def build_shard(importService, config, ready_df, exploded_df=None, stream=False):
+    entries = [{} for element in range(15)]
+
+    build_data_categories(importService, config, ready_df, entries)
+
+    build_systems(importService, config, ready_df, entries)
+
+    build_buckets(importService, config, ready_df, entries)
+
+    build_databases(importService, config, ready_df, entries)
+
+    build_measures(importService, config, ready_df, entries, stream)
+
+    if exploded_df is not None:
+        build_files(importService, config, exploded_df, entries, stream)
+
+        build_tables(importService, config, exploded_df, entries, stream)
+
+    return entries
+
+
+#get partitions, accounts spread over the shards by row count, largest first, rows keep their global positions as index
+def get_partitions(ready_df, exploded_df, number_of_shards):
+    counts = ready_df['_subscriptionExternalId'].astype(object).value_counts(sort=False)
+
+    loads = [0] * min(number_of_shards, max(len(counts), 1))
+
+    shard_of = {}
+
+    for account, count in sorted(counts.items(), key=lambda x: -x[1]):
+        shard_of[account] = loads.index(min(loads))
+
+        loads[shard_of[account]] += count
+
+    # rows without an account all land on the first shard
+    ready_shards = ready_df['_subscriptionExternalId'].astype(object).map(shard_of).fillna(0).astype(int)
+
+    exploded_shards = exploded_df['_subscriptionExternalId'].astype(object).map(shard_of).fillna(0).astype(int) if exploded_df is not None else None
+
+    return [(ready_df[ready_shards == s], exploded_df[exploded_shards == s] if exploded_df is not None else None) for s in range(len(loads))]
+
+
+#merge entries, per shard entries in the order a single pass over all rows would have produced them
+def merge_entries(shards):
+    entries = [{} for element in range(15)]
+
+    for n in range(15):
+        merged = {}
+
+        for shard in shards:
+            for k, v in shard[n].items():
+                kept = merged.get(k)
+
+                if kept is None:
+                    merged[k] = v
+
+                # rebuilt on every row, the entry of the last row sits at the position of the first
+                elif 'last' in v:
+                    merged[k] = {**(v if v['last'] > kept['last'] else kept), "order": min(v['order'], kept['order'])}
+
+                elif v['order'] < kept['order']:
+                    merged[k] = v
+
+        entries[n] = dict(sorted(merged.items(), key=lambda x: x[1]['order']))
+
+    return entries
+
+
+#build sharded entries, accounts are the domain boundary so each shard builds its own domains, systems and assets in a worker process
+def build_sharded_entries(importService, config, ready_df, exploded_df, workers):
+    ready_df = ready_df.reset_index(drop=True)
+
+    exploded_df = exploded_df.reset_index(drop=True) if exploded_df is not None else None
+
+    partitions = get_partitions(ready_df, exploded_df, workers)
+
+    logging.getLogger().debug(f"build sharded entries: {len(partitions)} shards")
+
+    with ProcessPoolExecutor(max_workers=len(partitions)) as executor:
+        shards = list(executor.map(build_shard, repeat(importService), repeat(config), *zip(*partitions)))
+
+    entries = merge_entries(shards)
+
+    build_data_concepts(importService, config, ready_df, entries)
+
+    return entries
+
+
+#build entries, the 15 entry categories derived column wise from the findings frames, sharded over worker processes when asked,
+#streamed categories are left as entry streams for save to write part by part, except after a sharded build which merges them in memory
+def build_entries(importService, config, ready_df, exploded_df=None, workers=1, stream=False):
+    logging.getLogger().debug("build entries")
+
+    if workers and workers > 1 and len(ready_df):
+        return build_sharded_entries(importService, config, ready_df, exploded_df, workers)
+
+    entries = build_shard(importService, config, ready_df, exploded_df, stream)
+
+    build_data_concepts(importService, config, ready_df, entries)
+
+    return entries
@@ -0,0 +1,157 @@
+import io
+import gzip
+import json
+
+from functools import lru_cache
+from json.encoder import encode_basestring_ascii
+
+try:
+    import zstandard
+
+except ImportError:
+    zstandard = None
+
+from models import Community, Domain, Identifier, Type, Entry
+
+
+#encode, the collibra import json of a value, byte for byte what json.dump gives with falsy model fields dropped
+def encode(o):
+    encoder = ENCODERS.get(type(o))
+
+    return encoder(o) if encoder else json.dumps(o)
+
+
+#encode model, fields in declaration order, falsy ones left out
+def encode_model(o):
+    return '{' + ', '.join(f'"{k}": {encode(getattr(o, k))}' for k in o.__slots__ if getattr(o, k)) + '}'
+
+
+#encode shared, interned models are immutable and repeat across entries, so each is encoded once
+encode_shared = lru_cache(maxsize=65536)(encode_model)
+
+
+#encode key, keys json converts are converted the same way
+def encode_key(k):
+    return encode_basestring_ascii(k if isinstance(k, str) else json.dumps(k))
+
+
+#encode dict
+def encode_dict(o):
+    return '{' + ', '.join(f'{encode_key(k)}: {encode(v)}' for k, v in o.items()) + '}'
+
+
+#encode list
+def encode_list(o):
+    return '[' + ', '.join(encode(v) for v in o) + ']'
+
+
+#encode entry, unrolled, the one model encoded once per entry
+def encode_entry(o):
+    fields = []
+
+    if o.resourceType:
+        fields.append(f'"resourceType": {encode(o.resourceType)}')
+
+    if o.identifier:
+        fields.append(f'"identifier": {encode_model(o.identifier)}')
+
+    if o.type:
+        fields.append(f'"type": {encode_shared(o.type)}')
+
+    if o.displayName:
+        fields.append(f'"displayName": {encode(o.displayName)}')
+
+    if o.attributes:
+        fields.append(f'"attributes": {encode_dict(o.attributes)}')
+
+    if o.relations:
+        fields.append(f'"relations": {encode_dict(o.relations)}')
+
+    return '{' + ', '.join(fields) + '}'
+
+
+#encoders per type, anything else goes through json
+ENCODERS = {
+    str: encode_basestring_ascii,
+    dict: encode_dict,
+    list: encode_list,
+    Entry: encode_entry,
+    Identifier: encode_shared,
+    Domain: encode_shared,
+    Community: encode_shared,
+    Type: encode_shared
+}
+
+
+#dump encoded, a json array written to the file one encoded entry at a time
+def dump_encoded(encoded, file):
+    file.write('[')
+
+    for i, s in enumerate(encoded):
+        if i:
+            file.write(', ')
+
+        file.write(s)
+
+    file.write(']')
+
+
+#split entries, encoded entries grouped into parts closed at the entries or the bytes budget, whichever comes first,
+#the output is ascii so characters are bytes
+def split_entries(entries, maximum_entries, maximum_bytes):
+    part, size = [], 2
+
+    for entry in entries:
+        s = encode(entry)
+
+        if part and (len(part) >= maximum_entries or size + len(s) > maximum_bytes):
+            yield part
+
+            part, size = [], 2
+
+        part.append(s)
+
+        size += len(s) + 2
+
+    yield part
+
+
+#part extensions, per compression
+PART_EXTENSIONS = {None: '', 'gzip': '.gz', 'zstd': '.zst'}
+
+
+#get part file, from a manifest part, parts of older manifests have no compression
+def get_part_file(part):
+    return f"{part['resource_location']}/{part['step_number']}.{part['file_name']}.{part['part_number']}.json{PART_EXTENSIONS.get(part.get('compression'), '')}"
+
+
+#open part, text for writing, decompressed bytes for reading
+def open_part(name, mode, compression=None):
+    if compression not in PART_EXTENSIONS:
+        raise Exception(f'Error: unknown compression {compression}')
+
+    if compression == 'zstd' and zstandard is None:
+        raise Exception('Error: zstd compression needs the zstandard package')
+
+    if mode == 'w':
+        if compression == 'gzip':
+            return gzip.open(name, 'wt', encoding='ascii')
+
+        if compression == 'zstd':
+            return io.TextIOWrapper(zstandard.ZstdCompressor().stream_writer(open(name, 'wb')), encoding='ascii')
+
+        return open(name, 'w')
+
+    if compression == 'gzip':
+        return gzip.open(name, 'rb')
+
+    if compression == 'zstd':
+        return zstandard.ZstdDecompressor().stream_reader(open(name, 'rb'))
+
+    return open(name, 'rb')
+
+
+#write part
+def write_part(name, encoded, compression=None):
+    with open_part(name, 'w', compression) as file:
+        dump_encoded(encoded, file)
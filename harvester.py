@@ -19,6 +19,8 @@ from requests.auth import HTTPBasicAuth
 
 import requests
 
+from encoder import get_part_file, open_part
+
 
 #do import
 class DoImport(beam.DoFn):    
@@ -41,11 +43,12 @@ class DoImport(beam.DoFn):
             collibra.get("session").auth = HTTPBasicAuth(collibra.get("username"), collibra.get("password"))
 
             #get filename
-            filename = f"{element['resource_location']}/{element['step_number']}.{element['file_name']}.{element['part_number']}.json"
+            filename = get_part_file(element)
 
             payload = {'fileName': element['file_name']}
 
-            files=[('file',(element['file_name'],open(filename,'rb'),'application/json'))]
+            #compressed parts are uploaded as the json they hold
+            files=[('file',(element['file_name'],open_part(filename,'rb',element.get('compression')),'application/json'))]
 
             #post json job request
             response = collibra.get("session").post(f"{collibra.get('endpoint')}/import/json-job", data=payload, files=files)
@@ -1,50 +1,63 @@
 import json
 from dataclasses import dataclass, field
+from functools import lru_cache
 from typing import List, Dict, Optional
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Community:
     name: Optional[str] = field(default=None)
 
+    def to_dict(self):
+        return {k: getattr(self, k) for k in self.__slots__}
+
     def __str__(self):
         return f"Community [name={self.name}]"
-    
 
-@dataclass
+
+@dataclass(frozen=True, slots=True)
 class Domain:
     name: Optional[str] = field(default=None)
     community: Optional[Community] = field(default=None)
 
+    def to_dict(self):
+        return {k: getattr(self, k) for k in self.__slots__}
+
     def to_json(self):
-        return json.dumps(self, default=lambda o: o.__dict__, skipkeys=True)
+        return json.dumps(self, default=lambda o: o.to_dict(), skipkeys=True)
 
     def __str__(self):
         return f"Domain [name={self.name}, community={self.community}]"
-    
 
-@dataclass
+
+@dataclass(frozen=True, slots=True)
 class Identifier:
     name: Optional[str] = field(default=None)
     domain: Optional['Domain'] = field(default=None)
     community: Optional['Community'] = field(default=None)
 
+    def to_dict(self):
+        return {k: getattr(self, k) for k in self.__slots__}
+
     def to_json(self):
-        return json.dumps(self, default=lambda o: o.__dict__, skipkeys=True)
+        return json.dumps(self, default=lambda o: o.to_dict(), skipkeys=True)
 
     def __str__(self):
         return f"Identifier [name={self.name}, domain={self.domain}, community={self.community}]"
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Type:
     name: Optional[str] = field(default=None)
 
+    def to_dict(self):
+        return {k: getattr(self, k) for k in self.__slots__}
+
     def __str__(self):
-        return f"Type [name={self.name}]"    
+        return f"Type [name={self.name}]"
 
 
-@dataclass
+@dataclass(slots=True)
 class Entry:
     resourceType: Optional[str] = None
     identifier: Optional['Identifier'] = None
@@ -53,12 +66,15 @@ class Entry:
     attributes: Dict[str, List[str]] = field(default_factory=dict)
     relations: Dict[str, List['Identifier']] = field(default_factory=dict)
 
+    def to_dict(self):
+        return {k: getattr(self, k) for k in self.__slots__}
+
     def to_json(self):
-        return json.dumps(self, default=lambda o: o.__dict__, skipkeys=True)
+        return json.dumps(self, default=lambda o: o.to_dict(), skipkeys=True)
 
     def __str__(self) -> str:
         return f"Entry [resourceType={self.resourceType}, identifier={self.identifier}, type={self.type}, displayName={self.displayName}, attributes={self.attributes}, relations={self.relations}]"
-    
+
 
 @dataclass
 class Step:
@@ -66,9 +82,34 @@ class Step:
     resource_location: Optional[str] = field(default=None, metadata={"json": "resourceLocation"})
     file_name: Optional[str] = field(default=None, metadata={"json": "fileName"})
     part_number: Optional[int] = field(default=None, metadata={"json": "partNumber"})
+    compression: Optional[str] = field(default=None, metadata={"json": "compression"})
 
     def to_json(self):
         return json.dumps(self, default=lambda o: o.__dict__, skipkeys=True)
 
     def __str__(self):
-        return f"Step [stepNumber={self.step_number}, resourceLocation={self.resource_location}, fileName={self.file_name}, partNumber={self.part_number}]"
\ No newline at end of file
+        return f"Step [stepNumber={self.step_number}, resourceLocation={self.resource_location}, fileName={self.file_name}, partNumber={self.part_number}, compression={self.compression}]"
+
+
+#intern community, communities, domains and types repeat for every entry, one shared instance each
+@lru_cache(maxsize=4096, typed=True)
+def intern_community(name):
+    return Community(name)
+
+
+#intern domain
+@lru_cache(maxsize=4096, typed=True)
+def intern_domain(name, community_name):
+    return Domain(name, intern_community(community_name))
+
+
+#intern type
+@lru_cache(maxsize=4096, typed=True)
+def intern_type(name):
+    return Type(name)
+
+
+#intern identifier, relation targets repeat across entries, bounded since asset names are unbounded
+@lru_cache(maxsize=65536, typed=True)
+def intern_identifier(name, domain_name, community_name):
+    return Identifier(name, intern_domain(domain_name, community_name))
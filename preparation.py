@@ -0,0 +1,143 @@
+import re
+import ast
+import json
+import logging
+
+import pandas as pd
+
+try:
+    import orjson
+
+    loads = orjson.loads
+
+except ImportError:
+    loads = json.loads
+
+
+#graph entity conf
+GRAPH_ENTITY_FIELDS = ['id', 'providerUniqueId', 'name', 'type', 'firstSeen', 'lastSeen']
+
+GRAPH_ENTITY_PROPERTIES = ['externalId', 'cloudPlatform', 'subscriptionExternalId', 'region', 'creationDate', 'status', '_environments']
+
+
+#finding conf
+FINDING_COLUMNS = {'ID': 'Finding ID', 'Category': 'Category', 'Classifier': 'Classifier', 'Unique Matches': 'Unique Matches', 'Total Matches': 'Total Matches', 'Severity': 'Severity', 'Finding Examples': 'Finding Examples'}
+
+EXPLODED_TYPES = ['BUCKET', 'DATABASE', 'DB_SERVER']
+
+EXPLODED_COLUMNS = ['id', 'name', 'type', '_cloudPlatform', '_subscriptionExternalId', '_region', '_creationDate', '_externalId', 'Finding ID', 'Category', 'Classifier']
+
+
+#one match per example object, a quote inside a json string is always escaped so values never match
+EXAMPLE_KEY_PATTERN = re.compile(r'(?<!\\)["\']key["\']\s*:')
+
+
+#parse, json first, python literal as a fallback for rows written with single quotes, never eval
+def parse(x):
+    if x is None or isinstance(x, (dict, list)):
+        return x
+
+    if not isinstance(x, (str, bytes)):
+        return None
+
+    try:
+        return loads(x)
+
+    except Exception:
+        try:
+            return ast.literal_eval(x)
+
+        except Exception:
+            return None
+
+
+#get graph entities, one parse per row and only the fields the findings tables use
+def get_graph_entities(graph_entities, fields=GRAPH_ENTITY_FIELDS, properties=GRAPH_ENTITY_PROPERTIES):
+    parsed = [parse(x) or {} for x in graph_entities]
+
+    columns = {f: [x.get(f) for x in parsed] for f in fields}
+
+    props = [x.get('properties') or {} for x in parsed]
+
+    columns.update({f"_{p}": [x.get(p) for x in props] for p in properties})
+
+    return pd.DataFrame(columns, index=graph_entities.index)
+
+
+#get examples count, counts example objects without deserializing them
+def get_examples_count(finding_examples):
+    return finding_examples.astype('string').str.count(EXAMPLE_KEY_PATTERN).astype('Int64')
+
+
+#get ready
+def get_ready(data_scan_df, resources_df):
+    data_scan_resources_df = data_scan_df.merge(resources_df[['externalId', 'graphEntity']], how='left', left_on='Resource External ID', right_on='externalId')
+
+    ready_df = get_graph_entities(data_scan_resources_df['graphEntity'])
+
+    for k, v in FINDING_COLUMNS.items():
+        ready_df[v] = data_scan_resources_df[k].values
+
+    ready_df['Examples Count'] = get_examples_count(ready_df['Finding Examples'])
+
+    ready_df['_creationYYMM'] = ready_df['_creationDate'].astype('string').str[0:7]
+
+    return ready_df
+
+
+#get exploded, one row per finding example of buckets and databases
+def get_exploded(ready_df):
+    exploded_df = ready_df.loc[ready_df['type'].isin(EXPLODED_TYPES), EXPLODED_COLUMNS + ['Finding Examples']]
+
+    examples = [parse(x) or [] for x in exploded_df['Finding Examples']]
+
+    counts = [len(x) for x in examples]
+
+    examples = [e if isinstance(e, dict) else {} for x in examples for e in x]
+
+    exploded_df = exploded_df.loc[exploded_df.index.repeat(counts), EXPLODED_COLUMNS].reset_index(drop=True)
+
+    exploded_df['key'] = [e.get('key') for e in examples]
+
+    exploded_df['path'] = [e.get('path') for e in examples]
+
+    return exploded_df
+
+
+#prepare, builds DATA_SCAN_RESOURCES_READY and DATA_SCAN_RESOURCES_EXPLODED from the report and the resources
+def prepare(data_scan_df, resources_df):
+    logging.getLogger().debug("prepare")
+
+    ready_df = get_ready(data_scan_df, resources_df)
+
+    exploded_df = get_exploded(ready_df)
+
+    return ready_df, exploded_df
+
+
+#run, re-runnable from the stored DATA_SCAN and RESOURCES_READY tables
+def run(session, data_scan_table="DATA_SCAN", resources_table="RESOURCES_READY"):
+    logging.getLogger().info("run preparation")
+
+    data_scan_df = session.table(data_scan_table).to_pandas()
+
+    resources_df = session.table(resources_table).to_pandas()
+
+    if '_deleted' in resources_df:
+        resources_df = resources_df[~resources_df['_deleted'].astype(bool)]
+
+    ready_df, exploded_df = prepare(data_scan_df, resources_df)
+
+    session.write_pandas(ready_df, "DATA_SCAN_RESOURCES_READY", auto_create_table=True, overwrite=True)
+
+    session.write_pandas(exploded_df, "DATA_SCAN_RESOURCES_EXPLODED", auto_create_table=True, overwrite=True)
+
+    return ready_df, exploded_df
+
+
+if __name__ == '__main__':
+    from snowflake.snowpark import Session
+
+    logging.getLogger().setLevel(logging.INFO)
+
+    run(Session.builder.config("connection_name", "wizio").create())
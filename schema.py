@@ -0,0 +1,98 @@
+import logging
+
+import numpy as np
+import pandas as pd
+
+from dataclasses import dataclass, field
+
+
+#low cardinality columns stored as categoricals
+CATEGORICAL_COLUMNS = ['type', '_region', '_cloudPlatform', '_subscriptionExternalId', '_status', '__environments', '_creationYYMM', 'Severity', 'Category', 'Classifier']
+
+#count columns stored as the narrowest integer that holds them
+INTEGER_COLUMNS = ['Unique Matches', 'Total Matches', 'Examples Count']
+
+#resource dimension of the exploded findings
+RESOURCE_COLUMNS = ['id', 'name', 'type', '_cloudPlatform', '_subscriptionExternalId', '_region', '_creationDate', '_externalId']
+
+#exploded findings columns, in the order of DATA_SCAN_RESOURCES_EXPLODED
+EXPLODED_COLUMNS = RESOURCE_COLUMNS + ['Finding ID', 'Category', 'Classifier', 'key', 'path']
+
+
+#get narrow integer, nullable when the column has missing values
+def get_narrow_integer(s):
+    values = pd.to_numeric(s, errors='coerce')
+
+    if values.isna().any():
+        bound = max(abs(values.min()), abs(values.max())) if values.notna().any() else 0
+
+        for dtype in ['Int8', 'Int16', 'Int32']:
+            if bound <= np.iinfo(dtype.lower()).max:
+                return values.astype(dtype)
+
+        return values.astype('Int64')
+
+    return pd.to_numeric(values, downcast='integer')
+
+
+#compact, categoricals for low cardinality columns and narrow ints for counts
+def compact(df, categorical_columns=CATEGORICAL_COLUMNS, integer_columns=INTEGER_COLUMNS):
+    df = df.copy()
+
+    for c in filter(lambda c: c in df, categorical_columns):
+        df[c] = df[c].astype('category')
+
+    for c in filter(lambda c: c in df, integer_columns):
+        df[c] = get_narrow_integer(df[c])
+
+    return df
+
+
+@dataclass
+class ExplodedFindings:
+    facts: pd.DataFrame = field(default_factory=pd.DataFrame)
+    resources: pd.DataFrame = field(default_factory=pd.DataFrame)
+    attrs: dict = field(default_factory=dict)
+
+    @classmethod
+    def from_frame(cls, df):
+        logging.getLogger().debug("exploded findings from frame")
+
+        df = compact(df)
+
+        resource_key = df.groupby(by=RESOURCE_COLUMNS, dropna=False, observed=True, sort=False).ngroup()
+
+        first = ~resource_key.duplicated()
+
+        resources = df.loc[first, RESOURCE_COLUMNS].set_axis(resource_key[first].values).sort_index()
+
+        facts = df[[c for c in EXPLODED_COLUMNS if c not in RESOURCE_COLUMNS]].copy()
+
+        facts.insert(0, 'resource_key', pd.to_numeric(resource_key.values, downcast='unsigned'))
+
+        for c in ['key', 'path']:
+            facts[c] = facts[c].astype('string')
+
+        return cls(facts.reset_index(drop=True), resources, dict(df.attrs))
+
+    @classmethod
+    def from_parts(cls, parts):
+        return cls(parts['facts'], parts['resources'])
+
+    def to_parts(self):
+        return {"facts": self.facts, "resources": self.resources}
+
+    def to_frame(self):
+        df = self.resources.iloc[self.facts['resource_key'].values].reset_index(drop=True)
+
+        df = pd.concat([df, self.facts.drop(columns=['resource_key'])], axis=1)[EXPLODED_COLUMNS]
+
+        df.attrs = dict(self.attrs)
+
+        return df
+
+    def __len__(self):
+        return len(self.facts)
+
+    def __str__(self):
+        return f"ExplodedFindings [facts={len(self.facts)}, resources={len(self.resources)}]"
@@ -3,8 +3,13 @@ import json
 import time
 import logging
 from datetime import datetime
+from itertools import islice
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
-from models import Community, Domain, Identifier, Type, Entry, Step
+from encoder import encode, get_part_file, open_part, split_entries, write_part
+
+from models import Identifier, Entry, Step, intern_community, intern_domain, intern_identifier, intern_type
 
 from dataclasses import dataclass, field
 from typing import List, Dict, Optional, Any
@@ -25,46 +30,19 @@ class ImportService:
     custom_asset_import_maximum_jobs: Optional[str] = None
     custom_asset_import_maximum_entries: Optional[str] = None
     steps: Optional[dict] = field(default_factory=dict) 
-    def get_domain(self, domain_community, domain_type, domain_name):
-        community = Community()
-        community.name=domain_community
-
-        type_ = Type()
-        type_.name = domain_type
-
-        identifier = Identifier()
-        identifier.name = domain_name
-        identifier.community = community
+    custom_asset_import_maximum_bytes: Optional[int] = None
+    compression: Optional[str] = None
+    writers: Optional[int] = 1
 
-        entry = Entry()
-        entry.resourceType = "Domain"
-        entry.identifier = identifier
-        entry.type = type_
+    def get_domain(self, domain_community, domain_type, domain_name):
+        identifier = Identifier(domain_name, community=intern_community(domain_community))
 
-        return entry
+        return Entry("Domain", identifier, intern_type(domain_type))
 
     def get_asset(self, asset_community, asset_domain, asset_type, asset_name, asset_display_name):
-        community = Community()
-        community.name = asset_community
-
-        domain = Domain()
-        domain.name = asset_domain
-        domain.community = community
-
-        type_ = Type()
-        type_.name = asset_type
+        identifier = Identifier(asset_name, intern_domain(asset_domain, asset_community))
 
-        identifier = Identifier()
-        identifier.name = asset_name
-        identifier.domain = domain
-
-        entry = Entry()
-        entry.resourceType = "Asset"
-        entry.identifier = identifier
-        entry.type = type_
-        entry.displayName = asset_display_name
-
-        return entry
+        return Entry("Asset", identifier, intern_type(asset_type), asset_display_name)
 
     def add_attributes(self, entry, name, value, type):
         if name not in entry.attributes:
@@ -82,16 +60,7 @@ class ImportService:
     def add_relations(self, entry, relation_type, relation_target, asset_domain, asset_community, asset_name):
         name = f"{relation_type}:{relation_target}"
 
-        community = Community()
-        community.name = asset_community
-
-        domain = Domain()
-        domain.name = asset_domain
-        domain.community = community
-
-        identifier = Identifier()
-        identifier.name = asset_name
-        identifier.domain = domain
+        identifier = intern_identifier(asset_name, asset_domain, asset_community)
         
         if name not in entry.relations:
             entry.relations[name] = []
@@ -107,43 +76,81 @@ class ImportService:
         if split:
             number_of_files = max(int(-(-len(entries) // self.custom_asset_import_maximum_entries)), self.custom_asset_import_maximum_jobs)
 
-        number_of_entries_per_file = -(-len(entries) // number_of_files)
+        number_of_entries = len(entries)
+
+        number_of_entries_per_file = -(-number_of_entries // number_of_files)
+
+        # entries are consumed once, part by part, so a stream is written without being held
+        entries = iter(entries)
 
-        from_index = 0
+        if split and self.custom_asset_import_maximum_bytes:
+            # a part also closes at the bytes budget, so parts of large entries get as much work per job as parts of small ones
+            parts = split_entries(entries, number_of_entries_per_file, self.custom_asset_import_maximum_bytes)
 
-        for i in range(number_of_files):
-            path = os.path.join(resource_location, self.run_id)
+        else:
+            parts = (map(encode, islice(entries, number_of_entries_per_file)) for i in range(max(-(-number_of_entries // max(number_of_entries_per_file, 1)), 1)))
 
-            try:
-                os.makedirs(path, exist_ok=True)
+        path = os.path.join(resource_location, self.run_id)
 
-            except Exception:
-                pass
+        try:
+            os.makedirs(path, exist_ok=True)
+
+        except Exception:
+            pass
+
+        # parts are encoded here, compressed and written by the pool, at most one part waits per writer
+        pool = ThreadPoolExecutor(max_workers=self.writers) if self.writers and self.writers > 1 else None
+
+        pending = deque()
+
+        try:
+            for i, part in enumerate(parts):
+                step = Step(step_number, path, file_name, i, self.compression)
+
+                if pool is None:
+                    write_part(get_part_file(step.__dict__), part, self.compression)
 
-            x = entries[from_index: min(from_index + number_of_entries_per_file, len(entries))]
+                    self.add_step(step)
 
-            name = f"{resource_location}/{self.run_id}/{step_number}.{file_name}.{i}.json"
+                    continue
 
-            with open(name, 'w') as file:
-                json.dump(x, file, default=lambda o: {k: v for k, v in o.__dict__.items() if v})
+                pending.append((pool.submit(write_part, get_part_file(step.__dict__), list(part), self.compression), step))
 
-            step = Step(step_number, path, file_name, i)
+                while len(pending) > self.writers:
+                    future, step = pending.popleft()
 
-            if step.step_number not in self.steps:
-                self.steps[step.step_number] = []
+                    future.result()
 
-            self.steps[step.step_number].append(step)
+                    self.add_step(step)
 
-            from_index += number_of_entries_per_file
+            while pending:
+                future, step = pending.popleft()
 
-            if from_index >= len(entries):
-                break
+                future.result()
 
+                self.add_step(step)
+
+        finally:
+            if pool is not None:
+                pool.shutdown(cancel_futures=True)
+
+    def add_step(self, step):
+        if step.step_number not in self.steps:
+            self.steps[step.step_number] = []
+
+        self.steps[step.step_number].append(step)
+
+    def get_manifest(self):
+        return {"run_id": self.run_id, "custom_asset_import_maximum_jobs": self.custom_asset_import_maximum_jobs, "custom_asset_import_maximum_entries": self.custom_asset_import_maximum_entries, "steps": self.steps}
+
+    def commit(self, resource_location):
+        # the harvester globs *.json, so the manifest only appears under that name once it is complete
         name = f"{resource_location}/{self.run_id}.json"
 
-        with open(name, 'w') as file:
-            json.dump(self, file, default=lambda o: o.__dict__)
+        with open(f"{name}.tmp", 'w') as file:
+            json.dump(self.get_manifest(), file, default=lambda o: o.__dict__)
 
+        os.replace(f"{name}.tmp", name)
 
     def harvest(self, collibra, config, input, run_id):
         file = (f'{input}/{run_id}.json')
@@ -154,7 +161,17 @@ class ImportService:
             with open(f"{file}.lock", "r") as f:
                 data = json.load(f)
 
-            results = [self.do_import(collibra, config, p) for k,v in data['steps'].items() for p in v]
+            # steps stay in order, later steps relate to assets of earlier ones, parts of a step are imported concurrently
+            results = []
+
+            for k,v in data['steps'].items():
+                results += self.do_imports(collibra, config, v, config.get('import_concurrent_jobs', 8))
+
+                # a part not completed stops the run before later steps, the lock is restored so the run is retried
+                failed = [p['part_number'] for p in v if (p.get('job') or {}).get('state') != "COMPLETED"]
+
+                if failed:
+                    raise Exception(f'Error: step {k} parts {failed} failed')
 
             steps = {}
 
@@ -171,7 +188,11 @@ class ImportService:
             os.rename(f"{file}.lock", f"{file}.done")
 
         except Exception as e:
-            os.rename(f"{file}.lock", f"{file}")
+            logging.getLogger().error(f"harvest: {run_id} error: {e}")
+
+            # no lock when the manifest was never committed or another harvester took it
+            if os.path.exists(f"{file}.lock"):
+                os.rename(f"{file}.lock", f"{file}")
 
             return
 
@@ -179,35 +200,79 @@ class ImportService:
     
 
     def do_import(self, collibra, config, part):
+        return self.do_imports(collibra, config, [part], 1)[0]
+
+    def do_imports(self, collibra, config, parts, maximum_jobs):
         logging.getLogger().setLevel(logging.DEBUG)
 
-        logging.getLogger().debug(f"do import part: {part}")
+        waiting = deque(enumerate(parts))
 
-        file = f"{part['resource_location']}/{part['step_number']}.{part['file_name']}.{part['part_number']}.json"
+        # keyed by part, a submit response may carry no job id
+        running = {}
 
-        payload = {'fileName': file}
+        while waiting or running:
+            while waiting and len(running) < maximum_jobs:
+                index, part = waiting.popleft()
 
-        files=[('file',(file, open(file,'rb'),'application/json'))]
+                try:
+                    id, state, result = self.submit_import(collibra, part)
 
-        response = collibra.get("session").post(f"{collibra.get('endpoint')}/import/json-job", data=payload, files=files)
+                except Exception as e:
+                    logging.getLogger().error(f"do import part: {part} error: {e}")
 
-        id = response.json().get('id')
+                    part["job"] = None
 
-        state = response.json().get('state')
-        
-        while state != "COMPLETED" and state != "CANCELED" and state != "ERROR":
+                    continue
+
+                if state in ("COMPLETED", "CANCELED", "ERROR"):
+                    self.set_import_result(part, id, state, result)
+
+                else:
+                    running[index] = (id, part)
+
+            if not running:
+                continue
+
+            # one loop polls every job in flight
             time.sleep(1)
 
-            response = collibra.get("session").get(f"{collibra.get('endpoint')}/jobs/{id}")
-            
-            state = response.json()['state']
+            for index, (id, part) in list(running.items()):
+                try:
+                    response = collibra.get("session").get(f"{collibra.get('endpoint')}/jobs/{id}")
+
+                    if response.json()['state'] not in ("COMPLETED", "CANCELED", "ERROR"):
+                        continue
+
+                    self.set_import_result(part, id, response.json()['state'], response.json()['result'])
+
+                except Exception as e:
+                    logging.getLogger().error(f"do import part: {part} error: {e}")
+
+                    part["job"] = None
+
+                del running[index]
+
+        return parts
+
+    def submit_import(self, collibra, part):
+        logging.getLogger().debug(f"do import part: {part}")
+
+        file = get_part_file({**part, "compression": None})
+
+        payload = {'fileName': file}
+
+        # compressed parts are uploaded as the json they hold
+        with open_part(get_part_file(part), 'rb', part.get('compression')) as f:
+            files=[('file',(file, f,'application/json'))]
+
+            response = collibra.get("session").post(f"{collibra.get('endpoint')}/import/json-job", data=payload, files=files)
 
-        logging.getLogger().debug(f"do import file: {file} result: {response.json()['result']}")
+        return response.json().get('id'), response.json().get('state'), response.json().get('result')
 
-        part["job"] = {"id": id, "result": response.json()['result']}
+    def set_import_result(self, part, id, state, result):
+        logging.getLogger().debug(f"do import file: {get_part_file(part)} state: {state} result: {result}")
 
-        return part
-          
+        part["job"] = {"id": id, "state": state, "result": result}
 
     def to_json(self):
         return json.dumps(self, default=lambda o: o.__dict__, skipkeys=True)
@@ -0,0 +1,366 @@
+import os
+import re
+import glob
+import json
+import time
+import uuid
+import fcntl
+import shutil
+import logging
+import threading
+
+import pandas as pd
+import pyarrow as pa
+
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Callable, Optional
+
+
+#cache conf
+CACHE_LOCATION = './cache'
+SHARED_LOCATION = './shared'
+
+
+#get table version, a metadata probe that costs no table scan
+def get_table_version(session, table):
+    try:
+        row = session.sql(f"select row_count, last_altered from information_schema.tables where table_schema = current_schema() and table_name = '{table}'").collect()
+
+        if row:
+            return f"{row[0][0]}:{row[0][1].isoformat()}"
+
+    except Exception as error:
+        logging.getLogger().warning(f"get table version: {table} {error}")
+
+    return None
+
+
+#get cached version
+def get_cached_version(table, location=CACHE_LOCATION):
+    try:
+        with open(f"{location}/{table}.json", "r") as f:
+            return json.load(f).get('version')
+
+    except Exception:
+        return None
+
+
+#set cached table, parquet first then the version, each swapped in with a rename, temporary files are unique per writer
+#so replicas sharing the cache never write into the same one
+def set_cached_table(table, df, version, location=CACHE_LOCATION):
+    os.makedirs(location, exist_ok=True)
+
+    tmp = f"{os.getpid()}.{uuid.uuid4().hex}.tmp"
+
+    try:
+        df.to_parquet(f"{location}/{table}.parquet.{tmp}", index=False)
+
+    except Exception as error:
+        logging.getLogger().warning(f"set cached table: {table} {error}")
+
+        if os.path.exists(f"{location}/{table}.parquet.{tmp}"):
+            os.remove(f"{location}/{table}.parquet.{tmp}")
+
+        return
+
+    os.replace(f"{location}/{table}.parquet.{tmp}", f"{location}/{table}.parquet")
+
+    with open(f"{location}/{table}.json.{tmp}", "w") as f:
+        json.dump({"table": table, "version": version}, f)
+
+    os.replace(f"{location}/{table}.json.{tmp}", f"{location}/{table}.json")
+
+
+#get table, from the local cache unless snowflake reports a different version
+def get_table(session, table, location=CACHE_LOCATION):
+    version = get_table_version(session, table)
+
+    if version is not None and version == get_cached_version(table, location) and os.path.exists(f"{location}/{table}.parquet"):
+        logging.getLogger().debug(f"get table: {table} {version} from cache")
+
+        df = pd.read_parquet(f"{location}/{table}.parquet")
+
+        df.attrs['version'] = version
+
+        return df
+
+    logging.getLogger().debug(f"get table: {table} {version} from snowflake")
+
+    df = session.table(table).to_pandas()
+
+    if version is not None:
+        set_cached_table(table, df, version, location)
+
+    df.attrs['version'] = version
+
+    return df
+
+
+#get shared type, strings stay arrow backed so they are read straight from the mapped file
+def get_shared_type(t):
+    if pa.types.is_string(t) or pa.types.is_large_string(t):
+        return pd.StringDtype("pyarrow")
+
+    return None
+
+
+#publish shared table, writes every part into a new version directory then swaps the current pointer with a rename
+def publish_shared_table(table, version, parts, location=SHARED_LOCATION):
+    path = f"{location}/{table}"
+
+    # a new directory for every publish, files other processes have mapped are never written again
+    name = f"{re.sub('[^0-9A-Za-z]+', '_', version)}.{os.getpid()}.{uuid.uuid4().hex}"
+
+    os.makedirs(f"{path}/{name}")
+
+    for k, df in parts.items():
+        arrow_table = pa.Table.from_pandas(df, preserve_index=False)
+
+        with pa.OSFile(f"{path}/{name}/{k}.arrow", 'wb') as sink:
+            with pa.ipc.new_file(sink, arrow_table.schema) as writer:
+                writer.write_table(arrow_table)
+
+    previous = get_shared_pointer(table, location)
+
+    with open(f"{path}/current.{name}.tmp", "w") as f:
+        json.dump({"version": version, "name": name}, f)
+
+    os.replace(f"{path}/current.{name}.tmp", f"{path}/current")
+
+    # mapped files stay readable after unlink, the previous version is kept for readers that just resolved the pointer,
+    # older ones only go once the process that wrote them is gone or is this one
+    keep = [name, (previous or {}).get('name')]
+
+    cutoff = os.path.getmtime(f"{path}/{keep[1]}") if keep[1] and os.path.isdir(f"{path}/{keep[1]}") else time.time()
+
+    for d in glob.glob(f"{path}/*/"):
+        base = os.path.basename(os.path.normpath(d))
+
+        if base in keep or os.path.getmtime(d) >= cutoff or is_live_owner(base):
+            continue
+
+        shutil.rmtree(d, ignore_errors=True)
+
+
+#is live owner, whether a version directory belongs to another process that is still running
+def is_live_owner(name):
+    try:
+        pid = int(name.rsplit('.', 2)[1])
+
+    except (IndexError, ValueError):
+        return False
+
+    if pid == os.getpid():
+        return False
+
+    try:
+        os.kill(pid, 0)
+
+    except ProcessLookupError:
+        return False
+
+    except PermissionError:
+        pass
+
+    return True
+
+
+#lock file, exclusive across the processes of the host, yields False when not blocking and another process holds it
+@contextmanager
+def lock_file(name, blocking=True):
+    os.makedirs(os.path.dirname(name) or '.', exist_ok=True)
+
+    with open(name, "w") as f:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+        except BlockingIOError:
+            yield False
+
+            return
+
+        try:
+            yield True
+
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+#lock shared table, one process at a time downloads and publishes, the others wait then map what it published
+def lock_shared_table(table, location=SHARED_LOCATION):
+    return lock_file(f"{location}/{table}/lock")
+
+
+#get shared pointer
+def get_shared_pointer(table, location=SHARED_LOCATION):
+    try:
+        with open(f"{location}/{table}/current", "r") as f:
+            return json.load(f)
+
+    except Exception:
+        return None
+
+
+#read shared table, every part memory mapped read only
+def read_shared_table(table, location=SHARED_LOCATION):
+    pointer = get_shared_pointer(table, location)
+
+    if pointer is None:
+        return None, None
+
+    try:
+        parts = {}
+
+        for file in glob.glob(f"{location}/{table}/{pointer['name']}/*.arrow"):
+            arrow_table = pa.ipc.open_file(pa.memory_map(file, 'r')).read_all()
+
+            parts[os.path.basename(file)[:-len('.arrow')]] = arrow_table.to_pandas(split_blocks=True, types_mapper=get_shared_type)
+
+        return (pointer['version'], parts) if parts else (None, None)
+
+    except Exception as error:
+        logging.getLogger().warning(f"read shared table: {table} {error}")
+
+        return None, None
+
+
+#get shared table, mapped from the host wide store, published there first when snowflake reports a newer version
+def get_shared_table(session, table, to_parts=lambda df: {"table": df}, from_parts=lambda parts: parts["table"], location=SHARED_LOCATION):
+    version = get_table_version(session, table)
+
+    shared_version, parts = read_shared_table(table, location)
+
+    if parts is None or (version is not None and version != shared_version):
+        with lock_shared_table(table, location):
+            # another process may have published it while this one waited for the lock
+            shared_version, parts = read_shared_table(table, location)
+
+            if parts is None or (version is not None and version != shared_version):
+                logging.getLogger().debug(f"get shared table: {table} {version} publish")
+
+                df = get_table(session, table)
+
+                if version is None:
+                    return from_parts(to_parts(df))
+
+                downloaded = to_parts(df)
+
+                publish_shared_table(table, version, downloaded, location)
+
+                shared_version, parts = read_shared_table(table, location)
+
+                if parts is None:
+                    logging.getLogger().warning(f"get shared table: {table} {version} not readable, using the download")
+
+                    shared_version, parts = version, downloaded
+
+    result = from_parts(parts)
+
+    result.attrs['version'] = shared_version
+
+    return result
+
+
+@dataclass
+class Refresher:
+    load: Optional[Callable] = None
+    probe: Optional[Callable] = None
+    interval: float = 60
+    value: Any = None
+    version: Optional[str] = None
+    loaded_at: Optional[float] = None
+    error: Optional[Exception] = None
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+    loaded: threading.Event = field(default_factory=threading.Event, repr=False)
+    wake: threading.Event = field(default_factory=threading.Event, repr=False)
+    stopped: threading.Event = field(default_factory=threading.Event, repr=False)
+    thread: Optional[threading.Thread] = field(default=None, repr=False)
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run, name="refresher", daemon=True)
+
+            self.thread.start()
+
+        return self
+
+    def run(self):
+        while not self.stopped.is_set():
+            self.refresh()
+
+            self.wake.wait(self.interval)
+
+            self.wake.clear()
+
+    def refresh(self):
+        try:
+            version = self.probe() if self.probe else None
+
+            # the probe is cheap, the load only runs when it reports a change
+            if self.value is not None and self.probe is not None and version in (None, self.version):
+                return
+
+            value = self.load()
+
+            with self.lock:
+                self.value, self.version, self.loaded_at, self.error = value, version, time.time(), None
+
+            logging.getLogger().info(f"refresher: loaded version {version}")
+
+        except Exception as error:
+            logging.getLogger().error(f"refresher: {error}")
+
+            self.error = error
+
+        finally:
+            self.loaded.set()
+
+    def trigger(self):
+        self.wake.set()
+
+    def stop(self):
+        self.stopped.set()
+
+        self.wake.set()
+
+    def get(self, timeout=None):
+        self.loaded.wait(timeout)
+
+        with self.lock:
+            if self.value is None and self.error is not None:
+                raise self.error
+
+            return self.value
+
+    def get_age(self):
+        return time.time() - self.loaded_at if self.loaded_at else None
+
+    def __str__(self):
+        return f"Refresher [version={self.version}, loadedAt={self.loaded_at}, interval={self.interval}]"
+
+
+_refreshers = {}
+
+_refreshers_lock = threading.Lock()
+
+
+#get refresher, one per name in the process, created by the factory and started once, a refresher created for another key is
+#stopped and replaced
+def get_refresher(name, key, factory):
+    with _refreshers_lock:
+        current = _refreshers.get(name)
+
+        if current is not None and current[0] == key:
+            return current[1]
+
+        if current is not None:
+            logging.getLogger().info(f"get refresher: {name} replaced")
+
+            current[1].stop()
+
+        refresher = factory().start()
+
+        _refreshers[name] = (key, refresher)
+
+        return refresher
@@ -0,0 +1,37 @@
+import json
+
+import pandas as pd
+
+from builder import build_entries
+from schema import compact
+from services import ImportService
+from store import publish_shared_table, read_shared_table
+
+
+#a null string read back from the shared store is pd.NA, it is registered and saved as null
+def test_null_attribute_saved_as_null(tmp_path):
+    ready_df = compact(pd.DataFrame([{
+        'id': f'g{i}', 'name': f'bucket{i}', 'type': 'BUCKET', '_cloudPlatform': 'AWS', '_subscriptionExternalId': 'acct',
+        '_region': 'us-east-1', '_creationDate': date, '_externalId': f'ext{i}', 'Finding ID': f'f{i}', 'Category': 'PII',
+        'Classifier': 'Email', 'Severity': 'HIGH', 'Unique Matches': 1, 'Total Matches': 2
+    } for i, date in enumerate([None, '2024-01-01'])]))
+
+    publish_shared_table('READY', 'v1', {'table': ready_df}, str(tmp_path / 'shared'))
+
+    version, parts = read_shared_table('READY', str(tmp_path / 'shared'))
+
+    assert parts['table']['_creationDate'][0] is pd.NA
+
+    importService = ImportService('run', 1, 500)
+
+    entries = build_entries(importService, {'community_to_query': 'Community'}, parts['table'])
+
+    (tmp_path / 'runs').mkdir()
+
+    for i, e in enumerate(entries):
+        importService.save([v['entry'] for v in e.values()] if isinstance(e, dict) else e, str(tmp_path / 'runs'), 'run', i, True)
+
+    with open(tmp_path / 'runs' / 'run' / '6.run.0.json') as f:
+        bucket = json.load(f)[0]
+
+    assert bucket['attributes']['Created At'] == [None]
@@ -0,0 +1,247 @@
+import time
+import random
+import logging
+import threading
+
+from email.utils import parsedate_to_datetime
+
+import requests
+
+from requests.adapters import HTTPAdapter
+
+from dataclasses import dataclass, field
+from typing import Optional
+
+
+#authentication
+AUTH0_URLS = ['https://auth.wiz.io/oauth/token', 'https://auth0.gov.wiz.io/oauth/token']
+COGNITO_URLS = ['https://auth.app.wiz.io/oauth/token', 'https://auth.gov.wiz.io/oauth/token']
+
+
+#token conf
+DEFAULT_TOKEN_LIFETIME = 3600
+TOKEN_EXPIRY_MARGIN = 60
+
+
+#pool conf
+POOL_CONNECTIONS = 4
+POOL_MAXSIZE = 16
+
+
+#rate limit conf
+RATE_LIMIT_ERROR_CODES = ['RATE_LIMIT_EXCEEDED', 'TOO_MANY_REQUESTS', 'THROTTLED']
+REQUESTS_PER_SECOND = 10
+REQUESTS_BURST = 10
+
+
+#get retry after, in seconds, from the header or from the graphql error extensions
+def get_retry_after(response, errors=None):
+    values = [response.headers.get('Retry-After')] + [(e.get('extensions') or {}).get('retryAfter') for e in errors or []]
+
+    for value in filter(lambda v: v is not None, values):
+        try:
+            return max(float(value), 0)
+
+        except (TypeError, ValueError):
+            pass
+
+        try:
+            return max(parsedate_to_datetime(value).timestamp() - time.time(), 0)
+
+        except (TypeError, ValueError):
+            pass
+
+    return None
+
+
+#is rate limited
+def is_rate_limited(errors):
+    for error in errors or []:
+        if (error.get('extensions') or {}).get('code') in RATE_LIMIT_ERROR_CODES:
+            return True
+
+        if 'rate limit' in str(error.get('message', '')).lower():
+            return True
+
+    return False
+
+
+@dataclass
+class RetryPolicy:
+    max_retries: int = 5
+    base_delay: float = 1
+    max_delay: float = 60
+
+    def get_delay(self, attempt, retry_after=None):
+        if retry_after is not None:
+            return min(retry_after, self.max_delay) + random.uniform(0, self.base_delay)
+
+        # full jitter, so parallel callers retrying together spread out
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def __str__(self):
+        return f"RetryPolicy [maxRetries={self.max_retries}, baseDelay={self.base_delay}, maxDelay={self.max_delay}]"
+
+
+@dataclass
+class TokenBucket:
+    rate: float = REQUESTS_PER_SECOND
+    capacity: float = REQUESTS_BURST
+    tokens: Optional[float] = None
+    updated: float = field(default_factory=time.monotonic)
+    paused_until: float = 0
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def __post_init__(self):
+        if self.tokens is None:
+            self.tokens = self.capacity
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+
+                self.updated = now
+
+                if now < self.paused_until:
+                    wait = self.paused_until - now
+
+                elif self.tokens >= 1:
+                    self.tokens -= 1
+
+                    return
+
+                else:
+                    wait = (1 - self.tokens) / self.rate
+
+            time.sleep(wait)
+
+    def pause(self, delay):
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + delay)
+
+    def __str__(self):
+        return f"TokenBucket [rate={self.rate}, capacity={self.capacity}, tokens={self.tokens}]"
+
+
+#get auth params
+def generate_authentication_params(config):
+    audience = config.get('wizio_token_audience')
+
+    if not audience and config['wizio_token_url'] in AUTH0_URLS:
+        audience = 'beyond-api'
+
+    elif not audience and config['wizio_token_url'] in COGNITO_URLS:
+        audience = 'wiz-api'
+
+    if not audience:
+        raise Exception('Error: wrong token url')
+
+    return {
+        'grant_type': 'client_credentials',
+        'audience': audience,
+        'client_id': config['wizio_client_id'],
+        'client_secret': config['wizio_client_secret']
+    }
+
+
+@dataclass
+class WizService:
+    config: dict = field(default_factory=dict, repr=False)
+    token_expiry_margin: int = TOKEN_EXPIRY_MARGIN
+    token: Optional[str] = field(default=None, repr=False)
+    token_expires_at: float = 0
+    session: Optional[requests.Session] = field(default=None, repr=False)
+    bucket: TokenBucket = field(default_factory=TokenBucket, repr=False)
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def __post_init__(self):
+        if self.session is None:
+            self.session = requests.Session()
+
+            adapter = HTTPAdapter(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE)
+
+            self.session.mount('https://', adapter)
+
+            self.session.mount('http://', adapter)
+
+        self.bucket.rate = self.config.get('wizio_requests_per_second', self.bucket.rate)
+
+        self.bucket.capacity = self.config.get('wizio_requests_burst', self.bucket.capacity)
+
+    def request_token(self):
+        response = self.session.post(
+            self.config['wizio_token_url'],
+            headers = {'Content-Type': 'application/x-www-form-urlencoded'},
+            data = generate_authentication_params(self.config)
+        )
+
+        if response.status_code != requests.codes.ok:
+            raise Exception(f'Error: {response.text}')
+
+        if not response.json().get('access_token'):
+            raise Exception(f'Error: {response.json().get("message")}')
+
+        expires_in = response.json().get('expires_in') or DEFAULT_TOKEN_LIFETIME
+
+        return response.json().get('access_token'), time.monotonic() + max(int(expires_in) - self.token_expiry_margin, 0)
+
+    def get_token(self):
+        with self.lock:
+            if not self.token or time.monotonic() >= self.token_expires_at:
+                logging.getLogger().debug("request token")
+
+                self.token, self.token_expires_at = self.request_token()
+
+            return self.token
+
+    def invalidate_token(self, token):
+        with self.lock:
+            # another thread may already have refreshed it
+            if self.token == token:
+                self.token = None
+
+    def post(self, token, query, variables):
+        return self.session.post(
+            self.config['wizio_api_endpoint_url'],
+            headers = {'Content-Type': 'application/json', 'Authorization': 'Bearer ' + token},
+            json = {'query': query, 'variables': variables}
+        )
+
+    def send_request(self, query, variables):
+        self.bucket.acquire()
+
+        token = self.get_token()
+
+        response = self.post(token, query, variables)
+
+        if response.status_code == requests.codes.unauthorized:
+            self.invalidate_token(token)
+
+            response = self.post(self.get_token(), query, variables)
+
+        return response
+
+    def close(self):
+        self.session.close()
+
+    def __str__(self):
+        return f"WizService [endpoint={self.config.get('wizio_api_endpoint_url')}, tokenExpiresAt={self.token_expires_at}]"
+
+
+_services = {}
+
+_services_lock = threading.Lock()
+
+
+#get wiz service, one per client and endpoint so every caller in the process shares its pool and token
+def get_wiz_service(config):
+    key = (config['wizio_token_url'], config['wizio_client_id'], config['wizio_api_endpoint_url'])
+
+    with _services_lock:
+        if key not in _services:
+            _services[key] = WizService(dict(config))
+
+        return _services[key]